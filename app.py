@@ -1,15 +1,35 @@
+from concurrent.futures import TimeoutError
+import os
+import time
 import streamlit as st
 import numpy as np
+# Imported before any session starts: plotly looks pandas up in sys.modules, and would find it half
+# imported while another session's thread is still importing it
 import pandas as pd
+import classes.bundle as bundle
+from classes.budget import budget
+import classes.catalog as catalog
+import classes.figures as figures
+import classes.grid as grid
+import classes.metrics as metrics
 import classes.spectra as spectra
 import classes.model as model
-import plotly.express as px
+import classes.sed as sed
 from streamlit_extras.stateful_button import button as Button
 from streamlit_extras.add_vertical_space import add_vertical_space
 
 # Configure page
 st.set_page_config(page_title="AGNITE", page_icon='classes/assets/agnite.png', layout='wide')
 
+# Start timing this rerun's stages for the profiling panel and exported metrics
+rerun_start = time.perf_counter()
+metrics.registry.begin()
+metrics.count('app.reruns')
+
+# Show the hidden profiling panel with AGNITE_PROFILE=1 or ?profile=1 in the URL
+params = st.query_params if hasattr(st, 'query_params') else st.experimental_get_query_params()
+profile = os.environ.get('AGNITE_PROFILE') == '1' or '1' in params.get('profile', [])
+
 # Initialize angle to 0
 if 'angle' not in st.session_state:
     st.session_state['angle'] = 0
@@ -25,6 +45,10 @@ if 'default' not in st.session_state:
     st.session_state.default = 'Narrow Line Radio Galaxy'
     st.session_state['default'] = 'Narrow Line Radio Galaxy'
 
+# Initialize compared types to the default type
+if 'compare' not in st.session_state:
+    st.session_state['compare'] = [st.session_state['default']]
+
 # Initialize about to False
 if 'about' not in st.session_state:
     st.session_state['about'] = False
@@ -77,74 +101,215 @@ ind = {
 }
 
 
-# Create model and agn objects to initialize data and visualization
-mod = model.Model(r=910)
-agn = spectra.AGN(st.session_state.angle)
+@st.cache_resource
+def load_bundle():
+    """
+    Cached resource holding the precomputed bundle made by python -m classes bundle, shared by all sessions
+
+    Returns:
+        (Bundle): opened bundle, or None if there is none or it was made with other settings
+    """
+    pre = bundle.open_bundle()
+    if pre is None or not pre.matches(figures.SPEC_POINTS, model.RADIUS, model.WIDTH):
+        return None
+    return pre
 
 
-def make_spec(angle, lines):
+@st.cache_resource
+def load_agn(num):
+    """
+    Cached resource holding the read-only AGN data for a type, shared by all sessions
+
+    Args:
+        num (str): Swift BAT object ID number of the AGN
+
+    Returns:
+        (AGNView): AGN data that is never mutated, so concurrent sessions can share it
+    """
+    return spectra.AGNView(num)
+
+
+def make_spec(num, lines):
     """
     Function for creating plotly figure displaying spectrum
 
     Args:
+        num (str): Swift BAT object ID number of the AGN shown
         lines (bool): Determine whether to display emission line markers
 
     Returns:
         fig (plotly figure): figure of spectrum with or without emission lines marked
     """
-    df = agn.df
-    fig = px.line(df, x='Wavelength', y='Flux', labels={
-        "Wavelength": "Wavelength (&#197;)", "Flux": "Flux (erg cm<sup>-2</sup> s<sup>-1</sup> &#197;<sup>-1</sup>)"})
-    if lines:
-        agn.plot_lines(fig)
-    return fig
+    pre = load_bundle()
+    fig = pre.spec(num, lines) if pre is not None else None
+    if fig is not None:
+        metrics.count('bundle.hits')
+        return fig
+    return figures.make_spec(load_agn(num), lines)
 
 
-def make_sed(angle):
+@budget.memoize('figure.smoothed')
+def make_smoothed(num, lines, kernel, width):
     """
-    Function for creating plotly figure displaying SED
+    Cached function for creating plotly figure displaying a smoothed or rebinned spectrum
+
+    Args:
+        num (str): Swift BAT object ID number of the AGN shown
+        lines (bool): Determine whether to display emission line markers
+        kernel (str): 'gaussian', 'boxcar' or 'rebin'
+        width (int): Width in Angstrom of smoothing or bins
+
+    Returns:
+        fig (plotly figure): figure of processed spectrum with or without emission lines marked
+    """
+    return figures.make_spec(load_agn(num), lines, kernel=kernel, width=width)
+
+
+# Seconds the SED tab waits for NED before showing a placeholder instead
+SED_TIMEOUT = 10
+
+# Seconds an SED figure is kept before it is made again, picking up photometry refreshed in the background
+SED_TTL = 3600
+
+
+# Failed and timed out fetches raise, so they are never cached
+@budget.memoize('figure.sed', ttl=SED_TTL)
+def make_sed(num):
+    """
+    Cached function for creating plotly figure displaying SED
+
+    Args:
+        num (str): Swift BAT object ID number of the AGN shown
 
     Returns:
         fig (plotly figure): figure of SED
+
+    Raises:
+        TimeoutError: if the SED is not cached and NED takes longer than SED_TIMEOUT
     """
-    df = agn.get_sed()
-    fig = px.scatter(df, x='Frequency', y='Density', labels={
-        'Frequency': 'Frequency (Hz)', 'Density': 'Flux Density (Jy)'}, log_x=True, log_y=True)
-    return fig
+    pre = load_bundle()
+    fig = pre.sed(num) if pre is not None else None
+    if fig is not None:
+        metrics.count('bundle.hits')
+        return fig
+    return figures.make_sed(load_agn(num), timeout=SED_TIMEOUT)
 
 
-@st.cache_data
-def run(angle, lines):
+@budget.memoize('figure.spec')
+def run(num, lines):
     """
-    Cached driver function to update plots as user input changes
+    Cached driver function to update plots as user input changes, keyed by the AGN shown
+    rather than the viewing angle so moving within a type's angle range is free
 
     Args:
+        num (str): Swift BAT object ID number of the AGN shown
         lines (bool): Determine whether to display emission line markers
 
     Returns:
-        Dictionary of spectrum figure, SED figure, AGN type string, and AGN object string
+        Dictionary of spectrum figure, AGN type string, and AGN object string
     """
-    agn.rotate(st.session_state.angle)
-    spec = make_spec(angle, lines)
-    sed = make_sed(angle)
+    metrics.count('figure_cache.misses')
+    agn_type, obj = catalog.CLASSIFICATIONS[num]
+    spec = make_spec(num, lines)
 
-    vals = {'spec': spec, 'sed': sed, 'type': agn.type, 'obj': agn.obj}
+    vals = {'spec': spec, 'type': agn_type, 'obj': obj}
 
     return vals
 
 
-@st.cache_data
-def make_model(angle):
+@st.cache_resource
+def load_grid():
+    """
+    Cached resource holding every catalog spectrum resampled onto one wavelength grid, shared by all sessions
+
+    Returns:
+        (Grid): read-only grid the comparison tab slices its spectra from
+    """
+    return grid.get_grid()
+
+
+@budget.memoize('figure.compare')
+def make_compare(nums, mode):
+    """
+    Cached function for creating plotly figure comparing several AGN
+
+    Args:
+        nums (tuple): Swift BAT object ID numbers of the AGN compared
+        mode (str): 'flux', 'normalized' or 'ratio', as taken by figures.make_compare
+
+    Returns:
+        fig (plotly figure): figure of spectra
+    """
+    names = [catalog.CLASSIFICATIONS[num][1] for num in nums]
+    return figures.make_compare(load_grid(), list(nums), names, mode)
+
+
+# Each entry is a row lookup in the shared blend
+@budget.memoize('figure.blend')
+def make_blend(angle, chosen, num, lines):
+    """
+    Cached function for creating plotly figure displaying the spectrum blended from neighbouring AGN types
+
+    Args:
+        angle (int): Viewing angle in degrees
+        chosen (tuple): Pairs of AGN type and the object ID picked for it, the other types use their defaults
+        num (str): Swift BAT object ID number of the AGN whose emission lines are marked
+        lines (bool): Determine whether to display emission line markers
+
+    Returns:
+        fig (plotly figure): figure of blended spectrum
+    """
+    return figures.make_blend(grid.get_blend(chosen), angle, load_agn(num), lines)
+
+
+@st.cache_resource
+def load_frames(width=model.WIDTH):
+    """
+    Cached resource rendering the visualization model's angle frames, shared by all sessions
+
+    Args:
+        width (int): Width in pixels of the frames, the sidebar display width or the sweep's
+
+    Returns:
+        (Frames): renderer of the model's frames as WebP bytes, keeping none itself since
+        make_model caches them in the shared budget
+    """
+    return model.Frames(model.Model(r=model.RADIUS, width=width), maxsize=0, format='WEBP')
+
+
+@budget.memoize('figure.sweep')
+def make_sweep(chosen):
+    """
+    Cached function for creating the animated sweep of spectrum and model across all viewing angles
+
+    Args:
+        chosen (tuple): Pairs of AGN type and the object ID picked for it, the other types use their defaults
+
+    Returns:
+        fig (plotly figure): animated figure the browser plays without reruns
+    """
+    names = {num: agn_type for num, (agn_type, _) in catalog.CLASSIFICATIONS.items()}
+    # Frames are shared with every other sweep through the budget, whichever objects are blended
+    return figures.make_sweep(grid.get_blend(chosen), lambda angle: make_model(angle, figures.SWEEP_WIDTH), names)
+
+
+@budget.memoize('model.frame')
+def make_model(angle, width=model.WIDTH):
     """
     Cached function to update arrow orientation on visualization model
 
     Args:
         angle (int): Viewing angle in degrees
+        width (int): Width in pixels of the image, the bundle only holds the sidebar display width
 
     Returns:
-        (PIL Image): image with arrow pasted with updated location and angle
+        (bytes): encoded image with arrow pasted with updated location and angle
     """
-    return mod.paste(angle)
+    pre = load_bundle() if width == model.WIDTH else None
+    frame = pre.frame(angle) if pre is not None else None
+    if frame is not None:
+        return frame
+    return load_frames(width).get(angle)
 
 
 # Add slider in sidebar for user to input angle
@@ -152,8 +317,9 @@ st.session_state.angle = st.sidebar.slider('Galaxy Viewing Angle',
                             min_value=-90, max_value=90, value=type[st.session_state['default']], format="%+d°\n")
 
 # Display model in sidebar using cached function, so it updates with user input
-st.sidebar.image(make_model(st.session_state.angle),
-                 use_column_width='always', caption='Illustration by Audrey Whitmer')
+frame = make_model(st.session_state.angle)
+with metrics.timer('streamlit.image'):
+    st.sidebar.image(frame, use_column_width='always', caption='Illustration by Audrey Whitmer')
 
 # Add selectbox for user to view based on AGN type rather than angle, and set angle to default
 st.sidebar.selectbox('AGN Type',
@@ -161,23 +327,115 @@ st.sidebar.selectbox('AGN Type',
      'Narrow Line Radio Galaxy', 'Seyfert 1', 'Seyfert 2'), key='default',
                      index=ind[st.session_state['default']], help='Choose AGN type to view')
 
+# Add selectbox for choosing between the example objects of the current AGN type, if it has several
+agn_type, candidates = catalog.get_catalog().lookup(st.session_state.angle)
+choice = 0
+if len(candidates) > 1:
+    choice = st.sidebar.selectbox('Example Object', range(len(candidates)),
+                                  format_func=lambda i: candidates[i]['name'],
+                                  help='Choose which object of this AGN type to view')
+
+# Resolve the viewing angle to its AGN type and get the spectrum for this rerun at once
+agn_type, num, obj = spectra.classify(st.session_state.angle, choice)
+# Only the shown type's pick, so every other type in the blend and sweep keeps its default object
+chosen = ((agn_type, num),) if choice else ()
+result = run(num, st.session_state['lines'])
+
+# Start fetching the SED now, so NED works while the spectrum is sent to the browser, unless it is precomputed
+if load_bundle() is None or num not in load_bundle().manifest['sed']:
+    sed.cache.request(obj)
+
 # Set up columns for metrics
 metric1, metric2 = st.columns(2)
 
 # Create metrics displaying current AGN type and Obejct name
-metric1.metric(label='AGN Type', value=run(st.session_state.angle, st.session_state['lines'])['type'])
-metric2.metric(label='Object', value=run(st.session_state.angle, st.session_state['lines'])['obj'])
+metric1.metric(label='AGN Type', value=result['type'])
+metric2.metric(label='Object', value=result['obj'])
 
 # Create tabs for viewing spectrum and SED
-tab_spec, tab_sed = st.tabs(["Spectrum", "SED"])
+tab_spec, tab_sed, tab_compare = st.tabs(["Spectrum", "SED", "Compare"])
 
 # Display spectrum and toggle button for displaying emission lines in spectrum tab
 with tab_spec:
 
     st.toggle(label="Display Emission Lines", key='lines', value=True)
-    st.plotly_chart(run(st.session_state.angle, st.session_state['lines'])['spec'], use_container_width=True)
-
-# Display SED in sed tab
+    blended = st.toggle(label="Blend Neighbouring Types", key='blend', value=False,
+                        help='Fade between the normalized spectra of neighbouring AGN types as the viewing angle changes')
+    sweep = st.toggle(label="Animate Sweep", key='sweep', value=False,
+                      help='Play the blended spectrum and model across all viewing angles in the browser')
+    kernel_col, width_col = st.columns([1, 3])
+    kernel = kernel_col.selectbox('Smoothing', ('none',) + spectra.KERNELS, key='kernel',
+                                  format_func={'none': 'None', 'gaussian': 'Gaussian', 'boxcar': 'Boxcar',
+                                               'rebin': 'Rebin'}.get,
+                                  help='Smooth the spectrum, or merge pixels into wider bins conserving flux')
+    # Widths move in fixed steps, so every position of the slider is cached after its first use
+    width = width_col.slider('Width (Å)', min_value=0, max_value=40, step=2, value=10, key='width',
+                             disabled=kernel == 'none')
+    if sweep:
+        spec_fig = make_sweep(chosen)
+    elif kernel != 'none' and width > 0 and not blended:
+        spec_fig = make_smoothed(num, st.session_state['lines'], kernel, width)
+    elif blended:
+        angle = st.session_state.angle
+        mix = grid.get_blend(chosen).mix(angle)
+        st.caption(' + '.join('%d%% %s' % (round(100 * weight), catalog.CLASSIFICATIONS[n][0])
+                              for n, weight in mix.items()))
+        spec_fig = make_blend(angle, chosen, num, st.session_state['lines'])
+    else:
+        spec_fig = result['spec']
+    chart_col, table_col = st.columns([3, 1])
+    with metrics.timer('streamlit.plotly_chart'):
+        chart_col.plotly_chart(spec_fig, use_container_width=True)
+    # Lines measured in the shown object's own spectrum, even while the blend or sweep is displayed
+    table_col.dataframe(load_agn(num).measure_lines(), hide_index=True, use_container_width=True, column_config={
+        'Wavelength': st.column_config.NumberColumn('λ (Å)', format='%.1f'),
+        'Flux': st.column_config.NumberColumn('Flux (erg cm⁻² s⁻¹)', format='%.2e'),
+        'EW': st.column_config.NumberColumn('EW (Å)', format='%.1f',
+                                            help='Equivalent width, above a straight continuum fitted beside the line'),
+        'FWHM': st.column_config.NumberColumn('FWHM (km/s)', format='%.0f',
+                                              help='Broad lines of thousands of km/s are seen only in type 1 AGN')})
+
+# Display spectra of several AGN types on a shared wavelength grid in compare tab
+with tab_compare:
+
+    compared = st.multiselect('AGN Types', list(ind), key='compare',
+                              help='Choose AGN types to compare, the first is the reference for ratios')
+    mode = st.radio('Display', ('flux', 'normalized', 'ratio'), horizontal=True, key='compare_mode',
+                    format_func={'flux': 'Flux', 'normalized': 'Normalized at 5100 Å',
+                                 'ratio': 'Ratio to first type'}.get)
+    # The shown object stands in for its own type, and the default object for the others
+    cat = catalog.get_catalog()
+    nums = tuple(num if t == agn_type else cat.candidates[t][0]['num'] for t in compared)
+    if len(nums) < (2 if mode == 'ratio' else 1):
+        st.info('Choose %s AGN types to compare.' % ('two or more' if mode == 'ratio' else 'one or more'))
+    else:
+        with metrics.timer('streamlit.plotly_chart'):
+            st.plotly_chart(make_compare(nums, mode), use_container_width=True)
+
+# Display SED in sed tab, last so a slow NED query never holds up the rest of the page
 with tab_sed:
 
-    st.plotly_chart(run(st.session_state.angle, st.session_state['lines'])['sed'], use_container_width=True)
+    try:
+        with st.spinner('Loading SED from NED'):
+            sed_fig = make_sed(num)
+        with metrics.timer('streamlit.plotly_chart'):
+            st.plotly_chart(sed_fig, use_container_width=True)
+    except TimeoutError:
+        st.info('NED has not answered yet. The SED keeps loading in the background.')
+        st.button('Check again')
+    except Exception as e:
+        st.warning('The SED of %s could not be loaded from NED (%s).' % (obj, e))
+
+# Finish timing this rerun and show its stage breakdown when profiling
+metrics.registry.record('app.rerun', time.perf_counter() - rerun_start)
+trace = metrics.registry.end()
+if profile:
+    with st.expander('Profile'):
+        stages = pd.DataFrame(trace, columns=['Stage', 'Seconds'])
+        st.dataframe(stages.groupby('Stage', sort=False).agg(Calls=('Seconds', 'size'), Seconds=('Seconds', 'sum')),
+                     use_container_width=True)
+        st.json(metrics.registry.snapshot()['counters'])
+        usage = budget.usage()
+        st.caption('Cache budget: %.1f of %.0f MB in use' % (usage['bytes'] / 2 ** 20, usage['limit'] / 2 ** 20))
+        st.dataframe(pd.DataFrame.from_dict(usage['caches'], orient='index'), use_container_width=True)
+        st.code(metrics.registry.prometheus() + budget.prometheus(), language='text')
@@ -0,0 +1,180 @@
+"""
+Benchmark of AGNITE's import time, the part of every Streamlit worker start before app.py renders
+
+Runs the imports of app.py and of the classes package in fresh interpreters under
+python -X importtime, and checks that the render path never imports the heavy optional
+dependencies up front. app.py may only import pandas eagerly, and whatever Streamlit loads itself. Results are written as JSON to compare between commits.
+
+Run from anywhere in the repository:
+
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --compare benchmarks/results/import-abc1234.json
+"""
+import argparse
+import ast
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must stay out of each target's imports, since only some reruns need them
+LAZY = ['astropy', 'astroquery', 'pandas', 'plotly']
+TARGETS = {
+    'classes.spectra': ('import classes.spectra', LAZY),
+    'classes.store': ('import classes.store', LAZY),
+    'classes.model': ('import classes.model', LAZY),
+    'classes.catalog': ('import classes.catalog', LAZY),
+}
+
+# Imported by app.py up front on purpose: a half-imported pandas raced between concurrent first sessions
+APP_EAGER = ['pandas']
+
+
+def app_imports(packages=None):
+    """
+    Function to get the top-level import statements of app.py as code
+
+    Args:
+        packages (tuple): Only keep imports of these top-level packages, such as ('streamlit',)
+
+    Returns:
+        (str): import statements, one per line
+    """
+    with open(os.path.join(ROOT, 'app.py')) as f:
+        tree = ast.parse(f.read())
+    nodes = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    if packages is not None:
+        nodes = [node for node in nodes if (node.module if isinstance(node, ast.ImportFrom) else node.names[0].name)
+                 .split('.')[0] in packages]
+    return '\n'.join(ast.unparse(node) for node in nodes)
+
+
+def importtime(code):
+    """
+    Function to import modules in a fresh interpreter and read its import timings
+
+    Args:
+        code (str): Python code doing the imports
+
+    Returns:
+        (list): name, nesting depth and cumulative microseconds of every import, in the order they finished
+    """
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, capture_output=True,
+                         text=True, check=True).stderr
+    imports = []
+    for line in out.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented by two spaces per level under the module importing them
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((name.strip(), depth, int(cumulative)))
+    return imports
+
+
+def measure(code, repeat, startup):
+    """
+    Function to time the imports of some code over several fresh interpreters
+
+    Args:
+        code (str): Python code doing the imports
+        repeat (int): Number of interpreters to run
+        startup (set): Modules imported by the interpreter itself, left out of the total
+
+    Returns:
+        (dict): median, minimum and mean seconds, number of runs, slowest modules and modules loaded
+    """
+    totals, runs = [], []
+    for _ in range(repeat):
+        imports = [(name, depth, us) for name, depth, us in importtime(code) if name not in startup]
+        totals.append(sum(us for _, depth, us in imports if depth == 0) / 1e6)
+        # The target modules and what they import directly, to point at the cause of a regression
+        runs.append({name: us for name, depth, us in imports if depth <= 1})
+    slowest = {name: statistics.median(run.get(name, 0) for run in runs) / 1e6 for name in runs[0]}
+    slowest = dict(sorted(slowest.items(), key=lambda item: -item[1])[:10])
+    return {'median_s': statistics.median(totals), 'min_s': min(totals), 'mean_s': statistics.mean(totals),
+            'repeat': repeat, 'slowest': slowest, 'loaded': sorted({name for name, _, _ in imports})}
+
+
+def compare(results, base, threshold):
+    """
+    Function to print the change of every target against an earlier results file
+
+    Args:
+        results (dict): Results of this run
+        base (dict): Results of the earlier run
+        threshold (float): Ratio of medians above which a target counts as a regression
+
+    Returns:
+        (list): names of regressed targets
+    """
+    regressed = []
+    print('\n%-25s %12s %12s %8s' % ('target', 'base (ms)', 'now (ms)', 'ratio'))
+    for name, now in results.items():
+        if name not in base:
+            continue
+        ratio = now['median_s'] / base[name]['median_s'] if base[name]['median_s'] else float('inf')
+        flag = '  <-- slower' if ratio > threshold else ''
+        if flag:
+            regressed.append(name)
+        print('%-25s %12.1f %12.1f %8.2f%s' % (name, 1e3 * base[name]['median_s'], 1e3 * now['median_s'], ratio, flag))
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per target')
+    parser.add_argument('--out', default=None, help='results file (default: benchmarks/results/import-<commit>.json)')
+    parser.add_argument('--compare', default=None, help='earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=1.3, help='slowdown ratio reported as a regression')
+    args = parser.parse_args(argv)
+
+    startup = {name for name, _, _ in importtime('pass')}
+
+    # Streamlit loads some of the lazy modules itself, which app.py cannot avoid
+    framework = {name.split('.')[0] for name, _, _ in importtime(app_imports(('streamlit', 'streamlit_extras'))) if name not in startup}
+    targets = dict(TARGETS)
+    targets['app.py'] = (app_imports(), [mod for mod in LAZY if mod not in framework and mod not in APP_EAGER])
+
+    results, leaks = {}, []
+    for name, (code, lazy) in targets.items():
+        res = results[name] = measure(code, args.repeat, startup)
+        eager = sorted({mod.split('.')[0] for mod in res['loaded']} & set(lazy))
+        if eager:
+            leaks.append(name)
+        print('%-25s %10.1f ms%s' % (name, 1e3 * res['median_s'], '  imports ' + ', '.join(eager) if eager else ''))
+        for mod, seconds in list(res['slowest'].items())[1:6]:
+            print('    %-40s %8.1f ms' % (mod, 1e3 * seconds))
+        del res['loaded']
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = 'unknown'
+
+    out = args.out or os.path.join(ROOT, 'benchmarks', 'results', 'import-' + commit + '.json')
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump({'commit': commit, 'time': time.time(), 'python': platform.python_version(),
+                   'machine': platform.machine(), 'results': results}, f, indent=1)
+    print('\nWrote %s' % out)
+
+    if leaks:
+        print('Heavy dependencies imported eagerly by: %s' % ', '.join(leaks))
+        return 1
+    if args.compare:
+        with open(args.compare) as f:
+            base = json.load(f)['results']
+        if compare(results, base, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
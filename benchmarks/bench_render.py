@@ -0,0 +1,308 @@
+"""
+Benchmarks of AGNITE's render path, from reading FITS files to a full app.py rerun
+
+Runs against the bundled BASS files with a local stand-in for NED, so no network is used.
+Each benchmark reports wall time over several repeats and the peak memory allocated in one
+extra traced run. Results are written as JSON to compare between commits.
+
+Run from anywhere in the repository:
+
+    python benchmarks/bench_render.py                  # full suite, all 181 angles
+    python benchmarks/bench_render.py --quick          # fewer angles and repeats
+    python benchmarks/bench_render.py --compare benchmarks/results/abc1234.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.environ.setdefault('AGNITE_CACHE_DIR', tempfile.mkdtemp(prefix='agnite-bench-'))
+
+import numpy as np
+import plotly.graph_objects as go
+
+from classes import catalog, figures, grid, lines, model, sed, spectra
+from classes.budget import Budget, budget
+from classes.store import store
+
+
+def stub_photometry(obj):
+    """
+    Function standing in for NED, giving a fixed fake SED for each object name
+
+    Args:
+        obj (str): General name of object
+
+    Returns:
+        freq (ndarray): frequency in Hz
+        den (ndarray): flux density in Jy
+    """
+    rng = np.random.default_rng(zlib.crc32(obj.encode()))
+    freq = 10 ** rng.uniform(8, 19, 500)
+    den = 10 ** rng.normal(-1, 1, 500)
+    return freq, den
+
+
+def clear_caches():
+    """
+    Function to empty every in-process cache on the render path, for cold measurements
+    """
+    store.clear()
+    budget.clear()
+    spectra.line_overlay.cache_clear()
+    catalog.get_catalog.cache_clear()
+    lines.get_line_index.cache_clear()
+    grid.get_grid.cache_clear()
+    grid.get_blend.cache_clear()
+
+
+def measure(fn, repeat, setup=None):
+    """
+    Function to time a benchmark and measure its peak allocated memory
+
+    Args:
+        fn (callable): Benchmark to run
+        repeat (int): Number of timed runs
+        setup (callable): Function run untimed before every run, such as clear_caches
+
+    Returns:
+        (dict): median, minimum and mean time in seconds, number of runs and peak bytes
+    """
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'median_s': statistics.median(times), 'min_s': min(times), 'mean_s': statistics.mean(times),
+            'repeat': repeat, 'peak_bytes': peak}
+
+
+def bench_spectra(results, angles, repeat):
+    """
+    Function to benchmark FITS reading, the spectrum store and AGN.rotate
+    """
+    for low, _, agn_type, num, _ in catalog.TYPES:
+        results['open_spec/' + agn_type] = measure(
+            lambda: spectra.open_spec('assets/BASS_fits.zip/', 'BASS_DR1_' + num + '.fits'), repeat)
+        results['store/cold/' + agn_type] = measure(lambda: store.get(num), repeat, clear_caches)
+        results['store/warm/' + agn_type] = measure(lambda: store.get(num), repeat)
+
+    def sweep():
+        agn = spectra.AGN(angles[0])
+        for angle in angles:
+            agn.rotate(angle)
+
+    results['rotate/sweep/cold'] = measure(sweep, repeat, clear_caches)
+    results['rotate/sweep/warm'] = measure(sweep, repeat)
+
+    nums = [num for _, _, _, num, _ in catalog.TYPES]
+    results['grid/build'] = measure(grid.get_grid, repeat, grid.get_grid.cache_clear)
+    results['grid/select/normalized'] = measure(lambda: grid.get_grid().select(nums, normalize=True), repeat)
+    results['grid/ratio'] = measure(lambda: grid.get_grid().ratio(nums[1:], nums[0]), repeat)
+    results['blend/build'] = measure(grid.get_blend, repeat, grid.get_blend.cache_clear)
+    results['blend/sweep'] = measure(lambda: [grid.get_blend().at(angle) for angle in angles], repeat)
+
+    for kernel in spectra.KERNELS:
+        results['smooth/%s/Seyfert 2' % kernel] = measure(lambda: spectra.smoothed('0007', kernel, 10), repeat,
+                                                          spectra.smoothed.cache_clear)
+
+    # A budget a quarter the size of what is put in, so three of every four puts evict an entry
+    arrays = [np.zeros(1000, dtype=np.float32) for _ in range(1000)]
+
+    def churn():
+        cache = Budget(limit=sum(arr.nbytes for arr in arrays) // 4)
+        for i, arr in enumerate(arrays):
+            cache.compute(('bench', i), lambda: arr)
+            cache.get(('bench', i // 2))
+
+    results['budget/churn/1000'] = measure(churn, repeat)
+
+    mask = [center for center, _ in lines.MASTER.values()]
+    for _, _, agn_type, num, _ in catalog.TYPES:
+        centers = [center for center, _ in lines.get_line_index().lines(num).values()]
+        results['lines/measure/' + agn_type] = measure(lambda: lines.measure(*store.get(num), centers, mask), repeat)
+        results['lines/detect/' + agn_type] = measure(lambda: lines.detect(*store.get(num)), repeat)
+
+
+def bench_figures(results, repeat):
+    """
+    Function to benchmark emission line overlays and spectrum and SED figures of every type
+    """
+    for low, _, agn_type, num, _ in catalog.TYPES:
+        agn = spectra.AGN(low)
+        results['plot_lines/cold/' + agn_type] = measure(
+            lambda: agn.plot_lines(go.Figure()), repeat, spectra.line_overlay.cache_clear)
+        results['plot_lines/warm/' + agn_type] = measure(lambda: agn.plot_lines(go.Figure()), repeat)
+        for lines in (True, False):
+            name = 'make_spec/%s/%s' % ('lines' if lines else 'nolines', agn_type)
+            results[name + '/cold'] = measure(lambda: figures.make_spec(agn, lines), repeat, clear_caches)
+            results[name + '/warm'] = measure(lambda: figures.make_spec(agn, lines), repeat)
+        results['make_sed/' + agn_type] = measure(lambda: figures.make_sed(agn), repeat)
+
+    names = {num: agn_type for num, (agn_type, _) in catalog.CLASSIFICATIONS.items()}
+    frames = {}
+
+    def new_frames():
+        frames['frames'] = model.Frames(model.Model(r=model.RADIUS, width=figures.SWEEP_WIDTH), format='WEBP')
+
+    def sweep():
+        figures.make_sweep(grid.get_blend(), frames['frames'].get, names)
+
+    results['make_sweep/cold'] = measure(sweep, max(repeat // 2, 1), new_frames)
+    results['make_sweep/warm'] = measure(sweep, repeat)
+
+
+def bench_model(results, angles, repeat):
+    """
+    Function to benchmark compositing the sidebar model, directly and through cached frames
+    """
+    full = model.Model(r=910)
+    results['paste/full'] = measure(lambda: full.paste(45), repeat)
+
+    frames = {}
+
+    def new_frames():
+        frames['frames'] = model.Frames(model.Model(r=910, width=600), format='WEBP')
+
+    def sweep():
+        for angle in angles:
+            frames['frames'].get(angle)
+
+    results['frames/sweep/cold'] = measure(sweep, max(repeat // 2, 1), new_frames)
+    results['frames/sweep/warm'] = measure(sweep, repeat)
+
+
+def bench_app(results, angles, repeat):
+    """
+    Function to benchmark full app.py reruns with Streamlit's AppTest
+    """
+    import logging
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    logging.getLogger('streamlit').setLevel(logging.ERROR)
+    app = os.path.join(ROOT, 'app.py')
+
+    def cold():
+        st.cache_data.clear()
+        st.cache_resource.clear()
+        clear_caches()
+
+    results['app/first_run/cold'] = measure(lambda: AppTest.from_file(app, default_timeout=120).run(),
+                                            max(repeat // 2, 1), cold)
+
+    at = AppTest.from_file(app, default_timeout=120).run()
+
+    def sweep():
+        for angle in angles:
+            at.sidebar.slider[0].set_value(angle).run()
+
+    results['app/slider_sweep/warm'] = measure(sweep, 1)
+    results['app/slider_tick/warm'] = dict(results['app/slider_sweep/warm'])
+    for key in ('median_s', 'min_s', 'mean_s'):
+        results['app/slider_tick/warm'][key] /= len(angles)
+
+
+def compare(results, base, threshold):
+    """
+    Function to print the change of every benchmark against an earlier results file
+
+    Args:
+        results (dict): Results of this run
+        base (dict): Results of the earlier run
+        threshold (float): Ratio of medians above which a benchmark counts as a regression
+
+    Returns:
+        (list): names of regressed benchmarks
+    """
+    regressed = []
+    print('\n%-55s %12s %12s %8s' % ('benchmark', 'base (ms)', 'now (ms)', 'ratio'))
+    for name, now in results.items():
+        if name not in base:
+            continue
+        ratio = now['median_s'] / base[name]['median_s'] if base[name]['median_s'] else float('inf')
+        flag = '  <-- slower' if ratio > threshold else ''
+        if flag:
+            regressed.append(name)
+        print('%-55s %12.3f %12.3f %8.2f%s' % (name, 1e3 * base[name]['median_s'], 1e3 * now['median_s'],
+                                                ratio, flag))
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--quick', action='store_true', help='sweep every 15th angle with fewer repeats')
+    parser.add_argument('--repeat', type=int, default=None, help='timed runs per benchmark')
+    parser.add_argument('--only', default=None, help='run only benchmark groups containing this text')
+    parser.add_argument('--skip-app', action='store_true', help='skip the full app.py reruns')
+    parser.add_argument('--out', default=None, help='results file (default: benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', default=None, help='earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=1.2, help='slowdown ratio reported as a regression')
+    args = parser.parse_args(argv)
+
+    angles = list(range(-90, 91, 15 if args.quick else 1))
+    repeat = args.repeat or (3 if args.quick else 7)
+    sed.cache = sed.SEDCache(os.path.join(os.environ['AGNITE_CACHE_DIR'], 'sed'), fetcher=stub_photometry)
+
+    groups = [('spectra', lambda r: bench_spectra(r, angles, repeat)),
+              ('figures', lambda r: bench_figures(r, repeat)),
+              ('model', lambda r: bench_model(r, angles, repeat))]
+    if not args.skip_app:
+        groups.append(('app', lambda r: bench_app(r, angles, repeat)))
+
+    results = {}
+    for group, run in groups:
+        if args.only and args.only not in group:
+            continue
+        start = len(results)
+        run(results)
+        for name in list(results)[start:]:
+            res = results[name]
+            print('%-55s %10.3f ms  %10.1f kB peak' % (name, 1e3 * res['median_s'], res['peak_bytes'] / 1e3))
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = 'unknown'
+
+    out = args.out or os.path.join(ROOT, 'benchmarks', 'results', commit + '.json')
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump({'commit': commit, 'time': time.time(), 'python': platform.python_version(),
+                   'machine': platform.machine(), 'angles': len(angles),
+                   'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                   'results': results}, f, indent=1)
+    print('\nWrote %s' % out)
+
+    if args.compare:
+        with open(args.compare) as f:
+            base = json.load(f)['results']
+        if compare(results, base, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
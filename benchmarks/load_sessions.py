@@ -0,0 +1,184 @@
+"""
+Load test of app.py with many Streamlit sessions moving the controls at once, as in a classroom
+
+Every simulated session is its own AppTest, so sessions share the process-wide caches and
+spectrum store the way sessions of one server do. Each session runs a random sequence of
+viewing angle, AGN type and emission line changes on its own thread. NED is replaced by a
+local stand-in, optionally slowed down to imitate a busy NED.
+
+Run from anywhere in the repository:
+
+    python benchmarks/load_sessions.py                       # 20 sessions of 30 steps
+    python benchmarks/load_sessions.py --sessions 50 --cold  # start from empty caches
+    python benchmarks/load_sessions.py --ned-latency 2       # NED answering in 2 s
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import subprocess
+import threading
+import time
+
+# Imported first, since it puts the repository on the path and points the SED cache at a temporary directory
+from bench_render import ROOT, clear_caches, stub_photometry
+
+import numpy as np
+
+from classes import sed
+from classes.budget import budget
+from classes.catalog import CLASSIFICATIONS
+
+
+# AGN types offered by the type selectbox of app.py
+TYPES = ['Blazar', 'Radio-Loud Quasar', 'Radio-Quiet Quasar', 'Broad Line Radio Galaxy',
+         'Narrow Line Radio Galaxy', 'Seyfert 1', 'Seyfert 2']
+
+
+def stub_ned(latency):
+    """
+    Function to make a stand-in for NED answering after a delay
+
+    Args:
+        latency (float): Seconds every query takes
+
+    Returns:
+        (callable): fetcher taking an object name and returning frequency and density arrays
+    """
+    def fetch(obj):
+        time.sleep(latency)
+        return stub_photometry(obj)
+    return fetch
+
+
+def session(app, steps, seed, think, start, latencies, errors, dropped):
+    """
+    Function to run one simulated session through a random sequence of control changes
+
+    Args:
+        app (str): Path of app.py
+        steps (int): Number of control changes after the first run
+        seed (int): Seed of the session's random sequence
+        think (float): Longest pause in seconds between changes, drawn uniformly
+        start (Barrier): Barrier all sessions wait at, so they begin together
+        latencies (list): Shared list the duration of every rerun is appended to
+        errors (list): Shared list exceptions shown by the app are appended to
+        dropped (list): Shared list every rerun that came back empty is appended to
+    """
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+    at = AppTest.from_file(app, default_timeout=300)
+    start.wait()
+
+    def rerun(action):
+        began = time.perf_counter()
+        try:
+            action().run()
+        except Exception as e:
+            # A rerun that times out or breaks the test harness still counts against the session
+            errors.append('%s: %s' % (type(e).__name__, e))
+        latencies.append(time.perf_counter() - began)
+        errors.extend(str(e.value) for e in at.exception)
+        # AppTest swaps process-wide Streamlit globals around each run, so now and then a run
+        # overlapping another session's comes back with no elements at all. Those are counted
+        # apart from app errors, and the session is brought back with a plain rerun.
+        for _ in range(3):
+            if len(at.sidebar) or len(at.exception):
+                break
+            dropped.append(1)
+            at.run()
+
+    rerun(lambda: at)
+    for _ in range(steps):
+        if think:
+            time.sleep(rng.uniform(0, think))
+        kind = rng.choices(['angle', 'type', 'lines'], weights=[6, 2, 1])[0]
+        if kind == 'angle':
+            rerun(lambda: at.sidebar.slider[0].set_value(rng.randint(-90, 90)))
+        elif kind == 'type':
+            rerun(lambda: at.selectbox(key='default').set_value(rng.choice(TYPES)))
+        else:
+            rerun(lambda: at.toggle(key='lines').set_value(not at.toggle(key='lines').value))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--sessions', type=int, default=20, help='number of concurrent sessions')
+    parser.add_argument('--steps', type=int, default=30, help='control changes per session')
+    parser.add_argument('--think', type=float, default=0.0, help='longest pause in seconds between changes')
+    parser.add_argument('--ned-latency', type=float, default=0.0, help='seconds the NED stand-in takes per query')
+    parser.add_argument('--cold', action='store_true', help='start from empty caches, including the SED cache')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random control sequences')
+    parser.add_argument('--out', default=None, help='results file (default: benchmarks/results/load-<commit>.json)')
+    args = parser.parse_args(argv)
+
+    import streamlit as st
+
+    logging.getLogger('streamlit').setLevel(logging.ERROR)
+    sed_dir = os.path.join(os.environ['AGNITE_CACHE_DIR'], 'sed')
+    sed.cache = sed.SEDCache(sed_dir, fetcher=stub_ned(args.ned_latency))
+    if args.cold:
+        st.cache_data.clear()
+        st.cache_resource.clear()
+        clear_caches()
+    else:
+        sed.cache.prefetch([obj for _, obj in CLASSIFICATIONS.values()])
+
+    latencies, errors, dropped = [], [], []
+    start = threading.Barrier(args.sessions + 1)
+    app = os.path.join(ROOT, 'app.py')
+    threads = [threading.Thread(target=session, name='session-%d' % i, daemon=True,
+                                args=(app, args.steps, args.seed * 1000 + i, args.think, start, latencies, errors,
+                                      dropped))
+               for i in range(args.sessions)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    began = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - began
+
+    lat = np.array(latencies)
+    p50, p95, p99 = np.percentile(lat, [50, 95, 99]) if len(lat) else (float('nan'),) * 3
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if platform.system() == 'Darwin' else 1024)
+    report = {'sessions': args.sessions, 'steps': args.steps, 'think_s': args.think,
+              'ned_latency_s': args.ned_latency, 'cold': args.cold, 'reruns': len(lat), 'wall_s': wall,
+              'throughput_rps': len(lat) / wall, 'p50_s': p50, 'p95_s': p95, 'p99_s': p99,
+              'max_s': float(lat.max()) if len(lat) else float('nan'), 'peak_rss_bytes': peak_rss,
+              'errors': len(errors), 'dropped': len(dropped), 'cache': budget.usage()}
+
+    print('%d sessions x %d steps: %d reruns in %.1f s (%.1f reruns/s)'
+          % (args.sessions, args.steps, len(lat), wall, report['throughput_rps']))
+    print('rerun latency  p50 %.0f ms  p95 %.0f ms  p99 %.0f ms  max %.0f ms'
+          % (1e3 * p50, 1e3 * p95, 1e3 * p99, 1e3 * report['max_s']))
+    print('peak RSS %.0f MB, %d errors, %d empty test runs retried' % (peak_rss / 2 ** 20, len(errors), len(dropped)))
+    print('cache budget %.1f of %.0f MB in use' % (report['cache']['bytes'] / 2 ** 20, report['cache']['limit'] / 2 ** 20))
+    for name, cache in report['cache']['caches'].items():
+        if cache['hit_ratio'] is not None:
+            print('  %-20s %4d entries %8.1f MB  %3.0f%% hits' % (name, cache['entries'], cache['bytes'] / 2 ** 20,
+                                                             100 * cache['hit_ratio']))
+    for error in sorted(set(errors))[:5]:
+        print('  ' + error.splitlines()[0])
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = 'unknown'
+    out = args.out or os.path.join(ROOT, 'benchmarks', 'results', 'load-' + commit + '.json')
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump({'commit': commit, 'time': time.time(), 'python': platform.python_version(),
+                   'machine': platform.machine(), 'results': report}, f, indent=1)
+    print('\nWrote %s' % out)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
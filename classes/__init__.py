@@ -1,2 +1,13 @@
-from . import model
-from . import spectra
\ No newline at end of file
+import importlib
+
+
+# Submodules are imported on first attribute access, so importing one of them
+# does not pull in the dependencies of all the others
+__all__ = ['budget', 'bundle', 'catalog', 'figures', 'fitsio', 'grid', 'ingest', 'lines', 'metrics', 'model', 'sed',
+           'spectra', 'store']
+
+
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
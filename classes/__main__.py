@@ -0,0 +1,37 @@
+import sys
+
+from . import bundle
+from . import catalog
+from . import ingest
+from . import lines
+from . import sed
+
+
+# Command line tools of the package, run as python -m classes <command> [options]
+COMMANDS = {
+    'sed': (sed.main, 'Prefetch NED photometry for every AGN type'),
+    'ingest': (ingest.main, 'Convert BASS DR1 FITS files into one columnar store'),
+    'catalog': (catalog.main, 'Scan BASS FITS files into the catalog index'),
+    'bundle': (bundle.main, 'Precompute figures and model frames for fast cold starts'),
+    'lines': (lines.main, 'Detect emission lines in every BASS spectrum into the line index'),
+}
+
+
+def main(argv=None):
+    """
+    Command line entry point dispatching to the package's tools
+
+    Args:
+        argv (list): Command line arguments, defaults to sys.argv
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in COMMANDS:
+        print('usage: python -m classes <command> [options]\n\ncommands:')
+        for name, (_, help) in COMMANDS.items():
+            print('  %-10s %s' % (name, help))
+        return 0 if argv and argv[0] in ('-h', '--help') else 2
+    return COMMANDS[argv[0]][0](argv[1:])
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,353 @@
+from functools import wraps
+import heapq
+import itertools
+import os
+import threading
+import time
+
+import numpy as np
+
+from . import metrics
+
+
+# Seconds any entry is charged at least, so entries cheaper than timing noise are evicted least recently used first
+MIN_COST = 1e-3
+
+
+def default_limit():
+    """
+    Function to get the memory budget of the shared cache, overridable through AGNITE_CACHE_MB
+
+    Returns:
+        (int): budget in bytes
+    """
+    return int(float(os.environ.get('AGNITE_CACHE_MB', 256)) * 2 ** 20)
+
+
+def sizeof(value):
+    """
+    Function to estimate the number of bytes a cached value holds
+
+    Counts array buffers, strings and bytes, which is where figures, spectra, model frames
+    and SED tables keep nearly all of their memory, and a small overhead for everything else.
+
+    Args:
+        value: Value to measure, such as an ndarray, bytes, DataFrame, Spectrum or plotly figure
+
+    Returns:
+        (int): estimated size in bytes
+    """
+    if isinstance(value, np.ndarray):
+        # Views share their buffer with the array they were taken from, but are usually all that keeps it alive
+        return value.nbytes + 112
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value) + 49
+    if isinstance(value, dict):
+        return 64 + sum(sizeof(k) + sizeof(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return 56 + sum(sizeof(v) for v in value)
+    if hasattr(value, 'memory_usage'):
+        # Pandas DataFrame or Series
+        return int(np.sum(value.memory_usage(deep=True)))
+    if hasattr(value, 'to_plotly_json'):
+        # Plotly figure or trace
+        return sizeof(value.to_plotly_json())
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    return 32
+
+
+class Budget:
+    """
+    The Budget class is a process-wide, thread-safe cache of values from many functions
+    sharing one memory budget
+
+    Every entry is charged its size in bytes and remembers how long it took to compute.
+    Once the entries and any tracked caches hold more than limit bytes, entries are evicted
+    by GreedyDual-Size: the entry with the lowest recompute seconds per byte goes first, and
+    every hit lifts an entry above all older ones, so it behaves as least recently used among
+    entries of equal cost. Entries can also expire after a time to live. Concurrent requests
+    for the same missing entry compute it only once.
+
+    Args:
+        limit (int): Memory budget in bytes, defaults to default_limit()
+        ttl (float): Default seconds entries live, or None to keep them until evicted
+
+    Attributes:
+        limit (int): Memory budget in bytes
+        ttl (float): Default seconds entries live, or None
+    """
+    def __init__(self, limit=None, ttl=None):
+        self.limit = default_limit() if limit is None else limit
+        self.ttl = ttl
+        # key: [value, bytes, seconds, expires, priority]
+        self._entries = {}
+        self._heap = []
+        self._clock = 0.0
+        self._bytes = 0
+        self._stats = {}
+        self._tracked = {}
+        self._loading = {}
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+
+    def get(self, key, default=None):
+        """
+        Method to look up a cached value, counting a hit or miss for the cache named by key[0]
+
+        Args:
+            key (tuple): Cache name followed by anything hashable
+            default: Value to give if key is not cached or has expired
+
+        Returns:
+            cached value, or default
+        """
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is None:
+                self._stat(key[0], 'misses')
+                return default
+            self._stat(key[0], 'hits')
+            return entry[0]
+
+    def put(self, key, value, seconds=0.0, ttl=None, size=sizeof):
+        """
+        Method to add a value, evicting other entries if the budget is exceeded
+
+        Values larger than the whole budget are not kept.
+
+        Args:
+            key (tuple): Cache name followed by anything hashable
+            value: Value to cache
+            seconds (float): Time it took to compute value, the cost of evicting it
+            ttl (float): Seconds the entry lives, defaults to the budget's ttl
+            size (callable): Function giving the size of value in bytes
+        """
+        nbytes = max(int(size(value)), 1)
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._drop(key)
+            if nbytes > self.limit:
+                return
+            self._entries[key] = [value, nbytes, seconds, expires, 0.0]
+            self._bytes += nbytes
+            self._touch(key)
+            self._evict()
+
+    def compute(self, key, fn, ttl=None, size=sizeof):
+        """
+        Method to get a cached value, computing and caching it on a miss
+
+        Exceptions raised by fn are passed on and nothing is cached.
+
+        Args:
+            key (tuple): Cache name followed by anything hashable
+            fn (callable): Function without arguments computing the value
+            ttl (float): Seconds the entry lives, defaults to the budget's ttl
+            size (callable): Function giving the size of the value in bytes
+
+        Returns:
+            cached or computed value
+        """
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self._stat(key[0], 'hits')
+                return entry[0]
+            self._stat(key[0], 'misses')
+            # One lock per key so concurrent sessions asking for the same value compute it only once
+            loading = self._loading.setdefault(key, threading.Lock())
+
+        with loading:
+            with self._lock:
+                entry = self._lookup(key)
+                if entry is not None:
+                    return entry[0]
+            start = time.perf_counter()
+            try:
+                value = fn()
+                # Cached before the key's lock is dropped, so no thread can miss it in between
+                self.put(key, value, time.perf_counter() - start, ttl, size)
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+        return value
+
+    def memoize(self, name, ttl=None, size=sizeof):
+        """
+        Method to make a decorator caching a function's results in the budget
+
+        Arguments of the function must be hashable. The decorated function gains a
+        cache_clear method dropping its entries, as with functools.lru_cache.
+
+        Args:
+            name (str): Name of the cache in usage reports and metrics, such as 'figure.spec'
+            ttl (float): Seconds entries live, defaults to the budget's ttl
+            size (callable): Function giving the size of a result in bytes
+
+        Returns:
+            (callable): decorator
+        """
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                key = (name, args, tuple(sorted(kwargs.items()))) if kwargs else (name, args)
+                return self.compute(key, lambda: fn(*args, **kwargs), ttl, size)
+            wrapper.cache_clear = lambda: self.clear(name)
+            return wrapper
+        return decorator
+
+    def track(self, name, nbytes):
+        """
+        Method to count the memory of a cache managing its own entries against the budget
+
+        Tracked bytes are never evicted here, they leave less room for the budget's own entries.
+
+        Args:
+            name (str): Name of the cache in usage reports
+            nbytes (callable): Function without arguments giving the bytes the cache holds
+        """
+        with self._lock:
+            self._tracked[name] = nbytes
+
+    def usage(self):
+        """
+        Method to report the memory and hit ratio of every cache
+
+        Returns:
+            (dict): limit and bytes in use overall, and entries, bytes, hits, misses, evictions,
+            expirations and hit ratio of each cache
+        """
+        with self._lock:
+            caches = {name: dict(stat, entries=0, bytes=0) for name, stat in self._stats.items()}
+            for key, entry in self._entries.items():
+                cache = caches.setdefault(key[0], self._new_stat(entries=0, bytes=0))
+                cache['entries'] += 1
+                cache['bytes'] += entry[1]
+            tracked = dict(self._tracked)
+            used = self._bytes
+        for name, nbytes in tracked.items():
+            caches.setdefault(name, self._new_stat(entries=0, bytes=0))['bytes'] = nbytes()
+            caches[name]['tracked'] = True
+        for cache in caches.values():
+            lookups = cache['hits'] + cache['misses']
+            cache['hit_ratio'] = cache['hits'] / lookups if lookups else None
+        return {'limit': self.limit, 'bytes': used + sum(caches[name]['bytes'] for name in tracked),
+                'caches': dict(sorted(caches.items()))}
+
+    def prometheus(self):
+        """
+        Method to export memory use in the Prometheus text exposition format, next to the hit and
+        miss counters the budget adds to the metrics registry
+
+        Returns:
+            (str): metrics text
+        """
+        usage = self.usage()
+        out = ['# HELP agnite_cache_limit_bytes Memory budget of the shared cache',
+               '# TYPE agnite_cache_limit_bytes gauge',
+               'agnite_cache_limit_bytes %d' % usage['limit'],
+               '# HELP agnite_cache_bytes Memory held by each cache',
+               '# TYPE agnite_cache_bytes gauge']
+        out += ['agnite_cache_bytes{cache="%s"} %d' % (name, cache['bytes']) for name, cache in usage['caches'].items()]
+        out += ['# HELP agnite_cache_entries Number of entries held by each cache',
+                '# TYPE agnite_cache_entries gauge']
+        out += ['agnite_cache_entries{cache="%s"} %d' % (name, cache['entries'])
+                for name, cache in usage['caches'].items()]
+        return '\n'.join(out) + '\n'
+
+    def resize(self, limit):
+        """
+        Method to change the memory budget, evicting if necessary
+
+        Args:
+            limit (int): Memory budget in bytes
+        """
+        with self._lock:
+            self.limit = limit
+            self._evict()
+
+    def clear(self, name=None):
+        """
+        Method to drop cached entries and reset their hit and miss counts
+
+        Args:
+            name (str): Name of the cache to clear, or None for every cache
+        """
+        with self._lock:
+            for key in [key for key in self._entries if name is None or key[0] == name]:
+                self._drop(key)
+            if name is None:
+                self._stats.clear()
+                self._heap.clear()
+                self._clock = 0.0
+            else:
+                self._stats.pop(name, None)
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and (entry[3] is None or entry[3] > time.monotonic())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    @staticmethod
+    def _new_stat(**extra):
+        return dict({'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0}, **extra)
+
+    def _stat(self, name, kind):
+        stat = self._stats.get(name)
+        if stat is None:
+            stat = self._stats[name] = self._new_stat()
+        stat[kind] += 1
+        metrics.count('cache.%s.%s' % (name, kind))
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[3] is not None and entry[3] <= time.monotonic():
+            self._drop(key)
+            self._stat(key[0], 'expired')
+            return None
+        self._touch(key)
+        return entry
+
+    def _touch(self, key):
+        # GreedyDual-Size priority: the running clock plus the cost per byte of recomputing the entry
+        entry = self._entries[key]
+        entry[4] = self._clock + max(entry[2], MIN_COST) / entry[1]
+        heapq.heappush(self._heap, (entry[4], next(self._seq), key))
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _evict(self):
+        room = self.limit - sum(nbytes() for nbytes in self._tracked.values())
+        if self._bytes > room:
+            # Expired entries go before any live one
+            now = time.monotonic()
+            for key in [key for key, entry in self._entries.items() if entry[3] is not None and entry[3] <= now]:
+                self._drop(key)
+                self._stat(key[0], 'expired')
+        while self._bytes > room and self._heap:
+            priority, _, key = heapq.heappop(self._heap)
+            entry = self._entries.get(key)
+            # Heap items left behind by later hits or dropped entries are skipped
+            if entry is None or entry[4] != priority:
+                continue
+            self._clock = priority
+            self._drop(key)
+            self._stat(key[0], 'evictions')
+        if len(self._heap) > 4 * len(self._entries) + 64:
+            self._heap = [(entry[4], next(self._seq), key) for key, entry in self._entries.items()]
+            heapq.heapify(self._heap)
+
+
+# Shared budget of the process, holding figures, smoothed spectra, model frames and reduced SEDs
+budget = Budget()
@@ -0,0 +1,230 @@
+import argparse
+import json
+import os
+import threading
+import time
+
+from . import figures
+from . import model
+
+
+# Version of the bundle layout, bumped whenever stored figures or frames change shape
+VERSION = 3
+
+# Default directory bundles are written to and read from, holding one subdirectory per version
+BUNDLE = 'assets/bundle'
+
+
+def bundle_dir(directory=BUNDLE, version=VERSION):
+    """
+    Function to get the directory of one bundle version
+
+    Args:
+        directory (str): Directory holding bundles
+        version (int): Bundle layout version
+
+    Returns:
+        (str): path of versioned bundle directory
+    """
+    return os.path.join(directory, 'v%d' % version)
+
+
+def export(directory=BUNDLE, nums=None, log=print):
+    """
+    Function to render every spectrum and SED figure and every model frame into a static bundle
+
+    Figures are stored as Plotly JSON and frames as the WebP bytes the sidebar shows. SEDs
+    that cannot be fetched are left out, and the app computes them live instead.
+
+    Args:
+        directory (str): Directory holding bundles
+        nums (list): Swift BAT object ID numbers to export, defaults to every classified object
+        log (callable): Function called with progress messages
+
+    Returns:
+        manifest (dict): settings the bundle was made with and the entries it holds
+    """
+    from .catalog import CLASSIFICATIONS
+    from .spectra import AGNView
+
+    out = bundle_dir(directory)
+    for sub in ('spec', 'sed', 'model'):
+        os.makedirs(os.path.join(out, sub), exist_ok=True)
+
+    manifest = {'version': VERSION, 'created': time.time(), 'spec_points': figures.SPEC_POINTS,
+                'model': {'r': model.RADIUS, 'width': model.WIDTH, 'format': 'WEBP'},
+                'spec': [], 'sed': [], 'model_angles': []}
+
+    for num in nums or sorted(CLASSIFICATIONS):
+        agn = AGNView(num)
+        for lines in (True, False):
+            name = '%s-%s' % (num, 'lines' if lines else 'nolines')
+            write(os.path.join(out, 'spec', name + '.json'), figures.make_spec(agn, lines).to_json())
+            manifest['spec'].append(name)
+        try:
+            write(os.path.join(out, 'sed', num + '.json'), figures.make_sed(agn).to_json())
+            manifest['sed'].append(num)
+        except Exception as e:
+            log('No SED for %s (%s): %s' % (num, agn.obj, e))
+        log('Exported figures of %s (%s)' % (num, agn.obj))
+
+    frames = model.Frames(model.Model(r=model.RADIUS, width=model.WIDTH), format='WEBP', maxsize=0)
+    for angle in frames.angles:
+        write(os.path.join(out, 'model', '%d.webp' % angle), frames.get(angle))
+        manifest['model_angles'].append(angle)
+    log('Exported %d model frames' % len(manifest['model_angles']))
+
+    # The manifest goes last, so a bundle is only picked up once it is complete
+    write(os.path.join(out, 'manifest.json'), json.dumps(manifest, indent=1))
+    return manifest
+
+
+def write(path, data):
+    """
+    Function to write a text or bytes file atomically
+
+    Args:
+        path (str): Path of file
+        data (str or bytes): Contents
+    """
+    tmp = path + '.tmp'
+    with open(tmp, 'wb' if isinstance(data, bytes) else 'w') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class Bundle:
+    """
+    The Bundle class serves precomputed figures and model frames from an exported bundle
+
+    Only the manifest is read when a bundle is opened. Each figure or frame is read from
+    disk the first time it is asked for and kept in memory afterwards.
+
+    Args:
+        directory (str): Directory holding bundles
+
+    Attributes:
+        path (str): Path of versioned bundle directory
+        manifest (dict): Settings the bundle was made with and the entries it holds
+    """
+    def __init__(self, directory=BUNDLE):
+        self.path = bundle_dir(directory)
+        with open(os.path.join(self.path, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+        self._spec = set(self.manifest['spec'])
+        self._sed = set(self.manifest['sed'])
+        self._angles = set(self.manifest['model_angles'])
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    def matches(self, spec_points=None, r=None, width=None):
+        """
+        Method to check the bundle was made with the settings the app uses
+
+        Args:
+            spec_points (int): Maximum number of points per spectrum
+            r (int): Radius of model image in pixels
+            width (int): Display width of model image in pixels
+
+        Returns:
+            (bool): True if every given setting matches
+        """
+        m = self.manifest
+        return (m['version'] == VERSION
+                and (spec_points is None or m['spec_points'] == spec_points)
+                and (r is None or m['model']['r'] == r)
+                and (width is None or m['model']['width'] == width))
+
+    def spec(self, num, lines):
+        """
+        Method to get a precomputed spectrum figure
+
+        Args:
+            num (str): Swift BAT object ID number as a 4 digit string
+            lines (bool): Whether emission line markers are displayed
+
+        Returns:
+            fig (plotly figure): figure of spectrum, or None if it is not in the bundle
+        """
+        name = '%s-%s' % (num, 'lines' if lines else 'nolines')
+        if name not in self._spec:
+            return None
+        return self._figure(os.path.join('spec', name + '.json'))
+
+    def sed(self, num):
+        """
+        Method to get a precomputed SED figure
+
+        Args:
+            num (str): Swift BAT object ID number as a 4 digit string
+
+        Returns:
+            fig (plotly figure): figure of SED, or None if it is not in the bundle
+        """
+        if num not in self._sed:
+            return None
+        return self._figure(os.path.join('sed', num + '.json'))
+
+    def frame(self, angle):
+        """
+        Method to get a precomputed model frame
+
+        Args:
+            angle (int): Viewing angle in degrees
+
+        Returns:
+            (bytes): WebP image with arrow pasted, or None if it is not in the bundle
+        """
+        angle = int(round(angle))
+        if angle not in self._angles:
+            return None
+        return self._read(os.path.join('model', '%d.webp' % angle), 'rb')
+
+    def _figure(self, name):
+        import plotly.io as pio
+
+        return pio.from_json(self._read(name, 'r'))
+
+    def _read(self, name, mode):
+        with self._lock:
+            if name in self._loaded:
+                return self._loaded[name]
+        with open(os.path.join(self.path, name), mode) as f:
+            data = f.read()
+        with self._lock:
+            return self._loaded.setdefault(name, data)
+
+
+def open_bundle(directory=BUNDLE):
+    """
+    Function to open the bundle of the current version if it has been exported
+
+    Args:
+        directory (str): Directory holding bundles
+
+    Returns:
+        (Bundle): opened bundle, or None if there is none
+    """
+    try:
+        return Bundle(directory)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def main(argv=None):
+    """
+    Command line entry point to export the static bundle,
+    run as python -m classes bundle
+
+    Args:
+        argv (list): Command line arguments, defaults to sys.argv
+    """
+    parser = argparse.ArgumentParser(prog='python -m classes bundle',
+                                     description='Precompute figures and model frames for fast cold starts')
+    parser.add_argument('--dir', default=BUNDLE, help='directory holding bundles (default: %s)' % BUNDLE)
+    args = parser.parse_args(argv)
+
+    manifest = export(args.dir)
+    print('Wrote %s: %d spectrum figures, %d SED figures, %d model frames'
+          % (bundle_dir(args.dir), len(manifest['spec']), len(manifest['sed']), len(manifest['model_angles'])))
+    return 0
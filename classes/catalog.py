@@ -0,0 +1,339 @@
+import argparse
+from bisect import bisect_right
+import glob
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+
+# Viewing angle range in degrees, type, Swift BAT object ID and general name of the default example object of each AGN type
+TYPES = [
+    (75, 90, 'Blazar', '0619', '3C 273'),
+    (45, 75, 'Radio-Loud Quasar', '0715', '2MASX J14174289+6141523'),
+    (20, 45, 'Broad Line Radio Galaxy', '1110', '4C 50.55'),
+    # Maybe also 474? But that's a Seyfert 1 which doesn't make sense?
+    # Also 360
+    (0, 20, 'Narrow Line Radio Galaxy', '0474', 'VII Zw 292'),
+    # Also 10, 49,
+    (-45, 0, 'Seyfert 2', '0007', '2MASX J00091156-0036551'),
+    (-70, -45, 'Seyfert 1', '0126', 'Fairall 296'),
+    (-90, -70, 'Radio-Quiet Quasar', '0016', '[HB89] 0026+129'),
+]
+
+# Type and general name of every classified BASS object, including alternatives to the defaults in TYPES
+CLASSIFICATIONS = {num: (agn_type, obj) for _, _, agn_type, num, obj in TYPES}
+CLASSIFICATIONS.update({
+    '0002': ('Seyfert 1', 'Fairall 1203'),
+    '1146': ('Radio-Quiet Quasar', 'Mrk 304'),
+})
+
+# Default location of the persisted catalog index
+INDEX = 'assets/BASS_catalog.json'
+
+
+def snr(flux, err=None):
+    """
+    Function to estimate the median signal-to-noise ratio of a spectrum
+
+    Uses the flux errors when the file has them, and the DER_SNR estimator
+    (Stoehr et al. 2008) from the flux alone otherwise
+
+    Args:
+        flux (ndarray): flux density
+        err (ndarray): flux density error, or None
+
+    Returns:
+        (float): signal-to-noise ratio, or nan if it cannot be estimated
+    """
+    if err is not None and np.any(err > 0):
+        good = err > 0
+        return float(np.median(flux[good] / err[good]))
+    if len(flux) < 5:
+        return float('nan')
+    noise = 0.6052697 * np.median(np.abs(2 * flux[2:-2] - flux[:-4] - flux[4:]))
+    return float(np.median(flux) / noise) if noise > 0 else float('nan')
+
+
+def read_record(file):
+    """
+    Function to read the catalog record of one BASS FITS file
+
+    Args:
+        file (str): Path of FITS file, ending in the 4 digit object ID
+
+    Returns:
+        (dict): object ID, type, name, redshift, wavelength coverage, number of points and S/N
+    """
+    from . import fitsio
+    from .spectra import no_zero
+
+    num = re.search(r'(\d+)\.fits$', file).group(1)
+    with open(file, 'rb') as f:
+        header = fitsio.read_header(f)
+    _, data = fitsio.read_table(file)
+    ind = data['Rest-wavelength'] > 0
+    wave, flux = no_zero(data['Rest-wavelength'], data['Flux density'])
+    err = data['Flux density error'][ind] if 'Flux density error' in data.dtype.names else None
+    z = header.get('Z')
+    name = str(header.get('OBJECT', '')).strip()
+    del data
+
+    agn_type, known_name = CLASSIFICATIONS.get(num, (None, None))
+    return {
+        'num': num,
+        'type': agn_type,
+        'name': known_name or name or 'BASS DR1 ' + num,
+        'z': None if z is None else float(z),
+        'wave_min': float(wave.min()) if len(wave) else None,
+        'wave_max': float(wave.max()) if len(wave) else None,
+        'points': int(len(wave)),
+        'snr': snr(flux, err),
+    }
+
+
+def scan(path='assets/BASS_fits.zip/BASS_DR1_'):
+    """
+    Function to read the catalog records of every FITS file matching a path prefix
+
+    Args:
+        path (str): Path prefix of fits files
+
+    Returns:
+        (list): catalog records sorted by object ID
+    """
+    files = sorted(glob.glob(glob.escape(path) + '*.fits'))
+    return [read_record(file) for file in files]
+
+
+class Catalog:
+    """
+    The Catalog class indexes BASS objects by AGN type and viewing angle
+
+    Every type can have several candidate objects. The default object of the type in TYPES
+    comes first, followed by the rest in order of decreasing S/N. Viewing angles are matched
+    to types by binary search over the sorted angle ranges.
+
+    Args:
+        records (list): Catalog records as made by read_record
+        path (str): Path prefix of the fits files the records were read from
+
+    Attributes:
+        records (list): Catalog records
+        path (str): Path prefix of fits files
+        candidates (dict): Candidate records of each AGN type, best first
+    """
+    def __init__(self, records, path='assets/BASS_fits.zip/BASS_DR1_'):
+        self.records = records
+        self.path = path
+        self._by_num = {rec['num']: rec for rec in records}
+
+        self.candidates = {}
+        for _, _, agn_type, num, obj in TYPES:
+            default = self._by_num.get(num, {'num': num, 'type': agn_type, 'name': obj})
+            others = [rec for rec in records if rec['type'] == agn_type and rec['num'] != num]
+            others.sort(key=lambda rec: -np.nan_to_num(rec['snr'], nan=-np.inf))
+            self.candidates[agn_type] = [default] + others
+
+        ranges = sorted(TYPES)
+        self._lows = [low for low, _, _, _, _ in ranges]
+        self._ranges = ranges
+
+    def lookup(self, angle):
+        """
+        Method to find the AGN type and its candidate objects for a viewing angle in O(log n)
+
+        Args:
+            angle (int): Viewing angle in degrees
+
+        Returns:
+            type (str): Type of AGN
+            candidates (list): Candidate records for the type, default object first
+        """
+        i = bisect_right(self._lows, angle) - 1
+        if i < 0 or angle > self._ranges[-1][1]:
+            raise ValueError('Viewing angle must be between -90 and 90 degrees, got %r' % (angle,))
+        agn_type = self._ranges[i][2]
+        return agn_type, self.candidates[agn_type]
+
+    def angle_range(self, agn_type):
+        """
+        Method to get the viewing angle range of an AGN type
+
+        Args:
+            agn_type (str): Type of AGN
+
+        Returns:
+            (tuple): lowest and highest viewing angle in degrees
+        """
+        return next((low, high) for low, high, t, _, _ in TYPES if t == agn_type)
+
+    def get(self, num):
+        """
+        Method to get the record of an object
+
+        Args:
+            num (str): Swift BAT object ID number as a 4 digit string
+
+        Returns:
+            (dict): catalog record, or None if the object is not in the catalog
+        """
+        return self._by_num.get(num)
+
+    def query(self, agn_type=None, min_snr=None, covers=None):
+        """
+        Method to find objects matching all given conditions
+
+        Args:
+            agn_type (str): Type of AGN
+            min_snr (float): Lowest S/N allowed
+            covers (float): Rest wavelength in Angstrom the spectrum has to cover
+
+        Returns:
+            (list): matching catalog records
+        """
+        found = []
+        for rec in self.records:
+            if agn_type is not None and rec['type'] != agn_type:
+                continue
+            if min_snr is not None and not rec['snr'] >= min_snr:
+                continue
+            if covers is not None and not (rec['wave_min'] or 0) <= covers <= (rec['wave_max'] or 0):
+                continue
+            found.append(rec)
+        return found
+
+    def example(self, agn_type, chosen=None):
+        """
+        Method to get the object shown for an AGN type
+
+        Args:
+            agn_type (str): Type of AGN
+            chosen (dict): Object ID picked for some AGN types, the others show their default object
+
+        Returns:
+            (dict): record of the object picked for the type if it is one of its candidates,
+            and of its default object otherwise
+        """
+        candidates = self.candidates[agn_type]
+        num = (chosen or {}).get(agn_type)
+        return next((rec for rec in candidates if rec['num'] == num), candidates[0])
+
+    def neighbours(self, angle, chosen=None):
+        """
+        Method to get the objects likely to be shown next: the other candidates of the type and
+        the objects shown for the types on either side
+
+        Args:
+            angle (int): Viewing angle in degrees
+            chosen (dict): Object ID picked for some AGN types, the others show their default object
+
+        Returns:
+            (list): object IDs
+        """
+        i = bisect_right(self._lows, angle) - 1
+        nums = [rec['num'] for rec in self.lookup(angle)[1]]
+        for j in (i - 1, i + 1):
+            if 0 <= j < len(self._ranges):
+                nums.append(self.example(self._ranges[j][2], chosen)['num'])
+        return nums
+
+    def save(self, index=INDEX):
+        """
+        Method to persist the catalog as JSON
+
+        Args:
+            index (str): Path of JSON file
+        """
+        tmp = index + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'path': self.path, 'records': self.records}, f, indent=1)
+        os.replace(tmp, index)
+
+    @classmethod
+    def load(cls, index=INDEX):
+        """
+        Method to read a persisted catalog
+
+        Args:
+            index (str): Path of JSON file
+
+        Returns:
+            (Catalog): catalog read from the file
+        """
+        with open(index) as f:
+            data = json.load(f)
+        return cls(data['records'], data['path'])
+
+
+_catalogs = {}
+_lock = threading.Lock()
+
+
+def get_catalog(path='assets/BASS_fits.zip/BASS_DR1_', index=INDEX):
+    """
+    Function to get the shared catalog of a path prefix, scanning and persisting it on first use
+
+    A persisted index is not rescanned when FITS files are added, rebuild it with
+    python -m classes catalog instead
+
+    Args:
+        path (str): Path prefix of fits files
+        index (str): Path of JSON file the catalog is persisted in
+
+    Returns:
+        (Catalog): shared catalog
+    """
+    with _lock:
+        if path in _catalogs:
+            return _catalogs[path]
+        existing = Catalog.load(index) if os.path.exists(index) else None
+        if existing is not None and existing.path == path:
+            cat = existing
+        else:
+            cat = Catalog(scan(path), path)
+            # Never overwrite an index made for other files, and work on read-only installs
+            if existing is None:
+                try:
+                    cat.save(index)
+                except OSError:
+                    pass
+        _catalogs[path] = cat
+        return cat
+
+
+def _clear():
+    with _lock:
+        _catalogs.clear()
+
+
+# Forgets every shared instance, as with functools.lru_cache, so the next call reads the persisted index again
+get_catalog.cache_clear = _clear
+
+
+def main(argv=None):
+    """
+    Command line entry point to rebuild the catalog index and print it,
+    run as python -m classes catalog
+
+    Args:
+        argv (list): Command line arguments, defaults to sys.argv
+    """
+    parser = argparse.ArgumentParser(prog='python -m classes catalog',
+                                     description='Scan BASS FITS files into the catalog index')
+    parser.add_argument('--path', default='assets/BASS_fits.zip/BASS_DR1_', help='path prefix of FITS files')
+    parser.add_argument('--index', default=INDEX, help='JSON file to write')
+    args = parser.parse_args(argv)
+
+    cat = Catalog(scan(args.path), args.path)
+    cat.save(args.index)
+    with _lock:
+        _catalogs[args.path] = cat
+
+    print('%-5s %-25s %-28s %8s %8s %6s' % ('ID', 'Type', 'Name', 'Min (A)', 'Max (A)', 'S/N'))
+    for rec in cat.records:
+        print('%-5s %-25s %-28s %8.1f %8.1f %6.1f' % (rec['num'], rec['type'] or '-', rec['name'],
+                                                      rec['wave_min'], rec['wave_max'], rec['snr']))
+    return 0
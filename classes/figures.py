@@ -0,0 +1,202 @@
+import numpy as np
+
+from . import metrics
+
+
+# Maximum number of points sent to the browser per spectrum
+SPEC_POINTS = 2000
+
+
+def line(x, y, xlabel, ylabel):
+    """
+    Function for creating plotly figure of one WebGL line straight from arrays, looking the same
+    as plotly express's line but without building a DataFrame
+
+    Args:
+        x (ndarray): x values
+        y (ndarray): y values
+        xlabel (str): Title of x axis
+        ylabel (str): Title of y axis
+
+    Returns:
+        fig (plotly figure): figure of line
+    """
+    import plotly.graph_objects as go
+
+    fig = go.Figure(go.Scattergl(x=x, y=y, mode='lines', name='', showlegend=False, line_color='#636efa',
+                                 hovertemplate='%s=%%{x}<br>%s=%%{y}<extra></extra>' % (xlabel, ylabel)))
+    fig.update_layout(xaxis_title_text=xlabel, yaxis_title_text=ylabel, legend_tracegroupgap=0, margin_t=60)
+    return fig
+
+
+@metrics.timed('figures.make_spec')
+def make_spec(agn, lines, points=SPEC_POINTS, kernel=None, width=0):
+    """
+    Function for creating plotly figure displaying spectrum
+
+    Args:
+        agn (AGN): AGN to plot the spectrum of
+        lines (bool): Determine whether to display emission line markers
+        points (int): Maximum number of points to plot
+        kernel (str): 'gaussian', 'boxcar' or 'rebin' to smooth or rebin the spectrum, or None
+        width (float): Width in Angstrom of smoothing or bins, 0 for none
+
+    Returns:
+        fig (plotly figure): figure of spectrum with or without emission lines marked
+    """
+    wave, flux = agn.get_spec(points, kernel, width)
+    fig = line(wave, flux, "Wavelength (&#197;)", "Flux (erg cm<sup>-2</sup> s<sup>-1</sup> &#197;<sup>-1</sup>)")
+    if lines:
+        agn.plot_lines(fig)
+    return fig
+
+
+@metrics.timed('figures.make_sed')
+def make_sed(agn, timeout=None):
+    """
+    Function for creating plotly figure displaying SED
+
+    Each point is the median of the photometry in a log-frequency bin, with error bars
+    spanning the 16th to 84th percentile of the bin
+
+    Args:
+        agn (AGN): AGN to plot the SED of
+        timeout (float): Seconds to wait for NED, or None to wait until it answers
+
+    Returns:
+        fig (plotly figure): figure of SED
+    """
+    import plotly.graph_objects as go
+
+    df = agn.get_sed(timeout)
+    den = df['Density'].to_numpy()
+    fig = go.Figure(go.Scatter(
+        x=df['Frequency'].to_numpy(), y=den, mode='markers', name='', showlegend=False, marker_color='#636efa',
+        error_y=dict(type='data', symmetric=False, array=df['High'].to_numpy() - den,
+                     arrayminus=den - df['Low'].to_numpy(), thickness=1, width=0),
+        customdata=df['Count'].to_numpy(),
+        hovertemplate='Frequency (Hz)=%{x}<br>Flux Density (Jy)=%{y}<br>Measurements=%{customdata}<extra></extra>'))
+    fig.update_layout(xaxis=dict(type='log', title_text='Frequency (Hz)'),
+                      yaxis=dict(type='log', title_text='Flux Density (Jy)'), legend_tracegroupgap=0, margin_t=60)
+    return fig
+
+
+@metrics.timed('figures.make_compare')
+def make_compare(grid, nums, names, mode='flux'):
+    """
+    Function for creating plotly figure overlaying several spectra resampled onto a shared grid
+
+    Args:
+        grid (Grid): Resampled spectra to plot from
+        nums (list): Swift BAT object ID numbers of the spectra to plot
+        names (list): Legend name of each spectrum
+        mode (str): 'flux' to overlay flux density, 'normalized' to overlay spectra normalized
+            around 5100 Angstrom, or 'ratio' to divide normalized spectra by the first one
+
+    Returns:
+        fig (plotly figure): figure of spectra
+    """
+    import pandas as pd
+    import plotly.express as px
+
+    if mode == 'ratio':
+        matrix, label = grid.ratio(nums[1:], nums[0]), 'Ratio to %s' % names[0]
+        names = names[1:]
+    elif mode == 'normalized':
+        matrix, label = grid.select(nums, normalize=True), 'Normalized flux'
+    else:
+        matrix, label = grid.select(nums), "Flux (erg cm<sup>-2</sup> s<sup>-1</sup> &#197;<sup>-1</sup>)"
+
+    df = pd.DataFrame(dict(zip(names, matrix)))
+    df.insert(0, 'Wavelength', grid.wave)
+    fig = px.line(df, x='Wavelength', y=list(names), render_mode='webgl', labels={
+        'Wavelength': "Wavelength (&#197;)", 'value': label, 'variable': 'Object'})
+    return fig
+
+
+@metrics.timed('figures.make_blend')
+def make_blend(blend, angle, agn, lines):
+    """
+    Function for creating plotly figure displaying the spectrum blended for a viewing angle
+
+    Args:
+        blend (AngleBlend): Blended spectra of every viewing angle
+        angle (int): Viewing angle in degrees
+        agn (AGN): AGN of the viewing angle, whose emission lines are marked
+        lines (bool): Determine whether to display emission line markers
+
+    Returns:
+        fig (plotly figure): figure of blended spectrum with or without emission lines marked
+    """
+    fig = line(blend.wave, blend.at(angle), "Wavelength (&#197;)", "Normalized flux")
+    if lines:
+        agn.plot_lines(fig)
+    return fig
+
+
+# Degrees between the frames of the animated sweep, and display width in pixels of its model images
+SWEEP_STEP = 5
+SWEEP_WIDTH = 300
+
+
+@metrics.timed('figures.make_sweep')
+def make_sweep(blend, frame, names, step=SWEEP_STEP, points=SPEC_POINTS):
+    """
+    Function for creating plotly figure that animates the blended spectrum and model across all viewing angles
+
+    Every frame of the animation is part of the figure, so the browser plays and scrubs the
+    sweep on its own without asking the server for anything
+
+    Args:
+        blend (AngleBlend): Blended spectra of every viewing angle
+        frame (callable): Function giving the model frame of a viewing angle as WebP bytes, such as Frames.get
+        names (dict): Type of AGN of each object ID in the blend, for frame titles
+        step (int): Degrees between frames
+        points (int): Maximum number of points per spectrum
+
+    Returns:
+        fig (plotly figure): animated figure with play and pause buttons and an angle slider
+    """
+    import base64
+    import plotly.graph_objects as go
+
+    angles = list(range(blend.angles.start, blend.angles.stop, step))
+    if angles[-1] != blend.angles.stop - 1:
+        angles.append(blend.angles.stop - 1)
+    # Every spectrum shares the grid, so frames only carry flux, thinned by the same stride
+    stride = -(-len(blend.wave) // points)
+    wave = blend.wave[::stride]
+    flux = blend.at(angles)[:, ::stride]
+    low, high = np.nanmin(flux), np.nanmax(flux)
+
+    def title(angle):
+        mix = blend.mix(angle)
+        return '%+d°: %s' % (angle, ' + '.join('%d%% %s' % (round(100 * weight), names[num])
+                                              for num, weight in mix.items()))
+
+    def image(angle):
+        source = 'data:image/webp;base64,' + base64.b64encode(frame(angle)).decode('ascii')
+        return dict(source=source, xref='paper', yref='paper', x=0, y=1, sizex=.3, sizey=1,
+                    xanchor='left', yanchor='top', layer='above')
+
+    fig = go.Figure(
+        data=[go.Scatter(x=wave, y=flux[0], mode='lines', line_width=1)],
+        frames=[go.Frame(name=str(angle), data=[go.Scatter(y=row)],
+                         layout=dict(images=[image(angle)], title_text=title(angle)))
+                for angle, row in zip(angles, flux)],
+    )
+    play = dict(frame=dict(duration=120, redraw=True), transition=dict(duration=0), fromcurrent=True)
+    pause = dict(frame=dict(duration=0, redraw=False), mode='immediate')
+    fig.update_layout(
+        title_text=title(angles[0]), images=[image(angles[0])], showlegend=False, height=480,
+        xaxis=dict(domain=[.34, 1], title_text="Wavelength (&#197;)"),
+        yaxis=dict(range=[low - .05 * (high - low), high + .05 * (high - low)], title_text="Normalized flux"),
+        updatemenus=[dict(type='buttons', direction='left', x=0, y=-.12, xanchor='left', yanchor='top',
+                          buttons=[dict(label='Play', method='animate', args=[None, play]),
+                                   dict(label='Pause', method='animate', args=[[None], pause])])],
+        sliders=[dict(x=.34, len=.66, y=-.12, yanchor='top', currentvalue=dict(prefix='Viewing angle: '),
+                      steps=[dict(label='%+d°' % angle, method='animate',
+                                  args=[[str(angle)], dict(pause, frame=dict(duration=0, redraw=True))])
+                             for angle in angles])],
+    )
+    return fig
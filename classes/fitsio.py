@@ -0,0 +1,184 @@
+import numpy as np
+
+
+# FITS files are made of 2880 byte blocks, and headers of 80 character cards
+BLOCK = 2880
+CARD = 80
+
+# NumPy dtype of each binary table TFORM type code, all big-endian as stored on disk
+FORMATS = {
+    'L': 'S1',
+    'B': 'u1',
+    'I': '>i2',
+    'J': '>i4',
+    'K': '>i8',
+    'E': '>f4',
+    'D': '>f8',
+    'C': '>c8',
+    'M': '>c16',
+    'A': 'S',
+}
+
+
+def parse_value(text):
+    """
+    Function to convert the value of a header card to a Python value
+
+    Args:
+        text (str): Characters 11 to 80 of the card, holding the value and an optional comment
+
+    Returns:
+        (str, bool, int or float): value, or None if the card has none
+    """
+    text = text.strip()
+    if text.startswith("'"):
+        # Quotes inside strings are written twice, and trailing spaces are not significant
+        end = 1
+        while True:
+            end = text.find("'", end)
+            if end < 0 or text[end + 1:end + 2] != "'":
+                break
+            end += 2
+        return text[1:end if end > 0 else None].replace("''", "'").rstrip()
+    value = text.split('/', 1)[0].strip()
+    if value in ('T', 'F'):
+        return value == 'T'
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return float(value.replace('D', 'E'))
+
+
+def read_header(f):
+    """
+    Function to read the header of the HDU starting at the current position of a file
+
+    Args:
+        f (file): File opened in binary mode, positioned at the start of a header
+
+    Returns:
+        header (dict): keyword and value of every valued card, the first if repeated
+
+    Raises:
+        EOFError: if the file ends before the header does
+    """
+    header = {}
+    while True:
+        block = f.read(BLOCK)
+        if len(block) < BLOCK:
+            raise EOFError('FITS file ends inside a header')
+        for i in range(0, BLOCK, CARD):
+            card = block[i:i + CARD].decode('ascii', 'replace')
+            key = card[:8].strip()
+            if key == 'END':
+                return header
+            if card[8:10] == '= ' and key not in header:
+                header[key] = parse_value(card[10:])
+
+
+def data_size(header):
+    """
+    Function to get the number of bytes of data following a header, without block padding
+
+    Args:
+        header (dict): Header of an HDU
+
+    Returns:
+        (int): size of data in bytes
+    """
+    naxis = header.get('NAXIS', 0)
+    if naxis == 0:
+        return 0
+    count = 1
+    # Random groups start their axes at NAXIS2, with NAXIS1 = 0
+    for i in range(1, naxis + 1):
+        count *= header['NAXIS%d' % i] or (1 if i == 1 else 0)
+    return abs(header['BITPIX']) // 8 * header.get('GCOUNT', 1) * (header.get('PCOUNT', 0) + count)
+
+
+def table_dtype(header):
+    """
+    Function to get the NumPy record dtype of a binary table
+
+    Args:
+        header (dict): Header of a BINTABLE extension
+
+    Returns:
+        (dtype): record dtype with one field per column, named by TTYPE
+
+    Raises:
+        ValueError: if a column uses variable length arrays, bits or scaling
+    """
+    names, formats = [], []
+    for i in range(1, header['TFIELDS'] + 1):
+        tform = str(header['TFORM%d' % i]).strip()
+        digits = len(tform) - len(tform.lstrip('0123456789'))
+        repeat = int(tform[:digits]) if digits else 1
+        code = tform[digits:digits + 1]
+        if code not in FORMATS:
+            raise ValueError('Unsupported binary table format %r in column %d' % (tform, i))
+        if header.get('TSCAL%d' % i, 1) != 1 or header.get('TZERO%d' % i, 0) != 0:
+            raise ValueError('Scaled binary table column %d is not supported' % i)
+        names.append(header.get('TTYPE%d' % i) or 'col%d' % i)
+        if code == 'A':
+            formats.append('S%d' % repeat)
+        elif repeat == 1:
+            formats.append(FORMATS[code])
+        else:
+            formats.append((FORMATS[code], (repeat,)))
+    dtype = np.dtype({'names': names, 'formats': formats})
+    if dtype.itemsize != header['NAXIS1']:
+        raise ValueError('Columns take %d bytes, but rows are %d bytes long' % (dtype.itemsize, header['NAXIS1']))
+    return dtype
+
+
+def read_table(file, ext=1, memmap=True):
+    """
+    Function to read a binary table extension of a FITS file without astropy
+
+    Covers the fixed width tables of the BASS DR1 spectra. Variable length arrays, bit
+    columns and scaled columns raise ValueError instead, read those with astropy.
+
+    Args:
+        file (str): Path of FITS file
+        ext (int): Index of the HDU holding the table, the primary HDU being 0
+        memmap (bool): Map the table read-only instead of reading it into memory
+
+    Returns:
+        header (dict): keyword and value of every valued card of the table's header
+        data (ndarray): big-endian record array with one field per column, indexed by TTYPE
+    """
+    with open(file, 'rb') as f:
+        for _ in range(ext):
+            header = read_header(f)
+            f.seek(-(-data_size(header) // BLOCK) * BLOCK, 1)
+        header = read_header(f)
+        offset = f.tell()
+        if header.get('XTENSION') != 'BINTABLE':
+            raise ValueError('HDU %d of %s is not a binary table' % (ext, file))
+        dtype = table_dtype(header)
+        rows = header['NAXIS2']
+        if not memmap:
+            data = np.frombuffer(f.read(rows * dtype.itemsize), dtype=dtype, count=rows)
+            return header, data
+    if rows == 0:
+        return header, np.empty(0, dtype=dtype)
+    return header, np.memmap(file, dtype=dtype, mode='r', offset=offset, shape=(rows,))
+
+
+def read_columns(file, names, ext=1):
+    """
+    Function to read some columns of a binary table as native-endian arrays
+
+    Args:
+        file (str): Path of FITS file
+        names (list): TTYPE names of columns to read
+        ext (int): Index of the HDU holding the table
+
+    Returns:
+        (tuple): one native-endian ndarray per name, in the given order
+    """
+    _, data = read_table(file, ext)
+    return tuple(data[name].astype(data.dtype[name].newbyteorder('='), copy=True) for name in names)
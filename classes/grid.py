@@ -0,0 +1,293 @@
+from functools import lru_cache
+import warnings
+
+import numpy as np
+
+from . import catalog
+from . import metrics
+from .store import store
+
+
+# Spacing in Angstrom of the shared rest-frame grid, about the coarsest sampling of the BASS spectra
+STEP = 2.0
+
+# Rest wavelength and half width in Angstrom of the window spectra are normalized in, the usual AGN continuum point
+NORM_WAVE = 5100.0
+NORM_WIDTH = 50.0
+
+
+def resample(waves, fluxes, grid):
+    """
+    Function that interpolates several spectra onto one wavelength grid
+
+    Args:
+        waves (list): rest wavelength of each spectrum, in increasing order
+        fluxes (list): flux density of each spectrum
+        grid (ndarray): rest wavelength to interpolate at
+
+    Returns:
+        matrix (ndarray): float32 flux density of shape (spectra, grid points), nan outside each spectrum's coverage
+    """
+    matrix = np.empty((len(waves), len(grid)), dtype=np.float32)
+    for row, wave, flux in zip(matrix, waves, fluxes):
+        row[:] = np.interp(grid, wave, flux, left=np.nan, right=np.nan)
+    return matrix
+
+
+def normalization(wave, matrix, center=NORM_WAVE, width=NORM_WIDTH):
+    """
+    Function that finds the flux density each resampled spectrum is divided by to normalize it
+
+    Uses the median in the window around center, and the median of the whole spectrum for
+    spectra that do not cover the window
+
+    Args:
+        wave (ndarray): rest wavelength of grid
+        matrix (ndarray): flux density of shape (spectra, grid points)
+        center (float): Rest wavelength in Angstrom of normalization window
+        width (float): Half width in Angstrom of normalization window
+
+    Returns:
+        norm (ndarray): float32 flux density of each spectrum, 1 where a spectrum has no flux at all
+    """
+    window = np.abs(wave - center) <= width
+    # nanmedian warns about spectra with no flux in the window, which fall back below
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        norm = np.nanmedian(matrix[:, window], axis=1) if window.any() else np.full(len(matrix), np.nan)
+        norm = np.where(np.isfinite(norm) & (norm != 0), norm, np.nanmedian(matrix, axis=1))
+    return np.where(np.isfinite(norm) & (norm != 0), norm, 1).astype(np.float32)
+
+
+class Grid:
+    """
+    The Grid class holds catalog spectra resampled once onto a shared rest-frame wavelength grid
+
+    Every spectrum is a row of one contiguous float32 matrix, so comparing any set of objects
+    is a single array slice. Rows are also kept divided by their flux density around
+    NORM_WAVE, for comparing shapes rather than brightness. Both matrices are read-only.
+
+    Args:
+        nums (list): Swift BAT object ID numbers of the spectra
+        waves (list): rest wavelength of each spectrum
+        fluxes (list): flux density of each spectrum
+        step (float): Spacing of the grid in Angstrom
+
+    Attributes:
+        nums (tuple): Swift BAT object ID number of each row
+        wave (ndarray): Rest wavelength of grid in Angstrom, covering all spectra
+        flux (ndarray): Flux density of shape (objects, grid points), nan outside each spectrum's coverage
+        norm (ndarray): Flux density each row is divided by to normalize it
+        normalized (ndarray): Flux density divided by norm
+    """
+    def __init__(self, nums, waves, fluxes, step=STEP):
+        self.nums = tuple(nums)
+        self._rows = {num: i for i, num in enumerate(self.nums)}
+        low = np.floor(min(float(wave[0]) for wave in waves) / step) * step
+        high = np.ceil(max(float(wave[-1]) for wave in waves) / step) * step
+        self.wave = np.arange(low, high + step / 2, step, dtype=np.float32)
+        self.flux = resample(waves, fluxes, self.wave)
+        self.norm = normalization(self.wave, self.flux)
+        self.normalized = self.flux / self.norm[:, None]
+        for arr in (self.wave, self.flux, self.norm, self.normalized):
+            arr.setflags(write=False)
+
+    def rows(self, nums):
+        """
+        Method to get the row indices of objects
+
+        Args:
+            nums (list): Swift BAT object ID numbers
+
+        Returns:
+            (list): row index of each object
+
+        Raises:
+            KeyError: if an object is not in the grid
+        """
+        return [self._rows[num] for num in nums]
+
+    def select(self, nums, normalize=False):
+        """
+        Method to get the resampled spectra of objects
+
+        Args:
+            nums (list): Swift BAT object ID numbers
+            normalize (bool): Whether to give normalized flux density
+
+        Returns:
+            (ndarray): flux density of shape (objects, grid points), in the given order
+        """
+        return (self.normalized if normalize else self.flux)[self.rows(nums)]
+
+    def ratio(self, nums, reference, normalize=True):
+        """
+        Method to divide the resampled spectra of objects by the spectrum of a reference object
+
+        Args:
+            nums (list): Swift BAT object ID numbers
+            reference (str): Swift BAT object ID number to divide by
+            normalize (bool): Whether to divide normalized spectra, comparing shapes rather than brightness
+
+        Returns:
+            (ndarray): ratio of shape (objects, grid points), nan where either spectrum has no coverage
+        """
+        matrix = self.normalized if normalize else self.flux
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return matrix[self.rows(nums)] / matrix[self._rows[reference]]
+
+    def __contains__(self, num):
+        return num in self._rows
+
+    def __len__(self):
+        return len(self.nums)
+
+
+@lru_cache(maxsize=4)
+def get_grid(path='assets/BASS_fits.zip/BASS_DR1_', step=STEP):
+    """
+    Function that gives the cached grid of every object in the catalog that can be shown for an AGN type
+
+    Objects without a type, which are never compared or blended, are left out so their
+    wavelength coverage does not widen the grid with columns no shown spectrum covers.
+
+    Args:
+        path (str): Path prefix of fits files
+        step (float): Spacing of the grid in Angstrom
+
+    Returns:
+        (Grid): shared, read-only grid
+    """
+    nums = sorted({rec['num'] for candidates in catalog.get_catalog(path).candidates.values() for rec in candidates})
+    with metrics.timer('grid.build'):
+        specs = [store.get(num, path) for num in nums]
+        return Grid(nums, [spec.wave for spec in specs], [spec.flux for spec in specs], step)
+
+
+# Degrees over which the spectra of neighbouring types are blended at each boundary between their angle ranges
+BLEND_WIDTH = 10
+
+
+def smoothstep(x):
+    """
+    Function that rises smoothly from 0 to 1 as x goes from 0 to 1, with zero slope at both ends
+
+    Args:
+        x (ndarray): Position
+
+    Returns:
+        (ndarray): 0 below 0, 1 above 1 and 3x^2 - 2x^3 in between
+    """
+    x = np.clip(x, 0, 1)
+    return x * x * (3 - 2 * x)
+
+
+def blend_weights(angles, ranges, width=BLEND_WIDTH):
+    """
+    Function that gives how much each AGN type contributes to the spectrum at each viewing angle
+
+    Inside its angle range a type has weight 1. Across each boundary between two ranges the
+    weight passes smoothly from one type to the other over width degrees, so the weights of
+    every angle add up to 1. The outermost edges of the ranges do not fade.
+
+    Args:
+        angles (ndarray): Viewing angles in degrees
+        ranges (list): Lowest and highest viewing angle of each type
+        width (float): Degrees the blend at each boundary spans, 0 for sharp boundaries
+
+    Returns:
+        weights (ndarray): float32 weight of shape (angles, types)
+    """
+    angles = np.asarray(angles, dtype=np.float64)[:, None]
+    low = np.array([lo for lo, _ in ranges], dtype=np.float64)
+    high = np.array([hi for _, hi in ranges], dtype=np.float64)
+    width = max(width, 1e-9)
+    rise = np.where(low <= low.min(), 1, smoothstep((angles - low) / width + .5))
+    fall = np.where(high >= high.max(), 1, 1 - smoothstep((angles - high) / width + .5))
+    return (rise * fall).astype(np.float32)
+
+
+class AngleBlend:
+    """
+    The AngleBlend class holds a spectrum for every integer viewing angle, blended from the
+    normalized spectra of the AGN types around it
+
+    All 181 spectra are computed at once as one (angles, wavelengths) float32 matrix, so an
+    angle is answered by a row lookup. Where only some of the blended spectra cover a
+    wavelength, the rest of the weight goes to those that do.
+
+    Args:
+        grid (Grid): Resampled spectra to blend
+        nums (list): Swift BAT object ID number standing in for each type
+        ranges (list): Lowest and highest viewing angle of each type
+        width (float): Degrees the blend at each type boundary spans
+
+    Attributes:
+        wave (ndarray): Rest wavelength of grid in Angstrom
+        nums (tuple): Swift BAT object ID number of each type
+        weights (ndarray): Weight of each type at each angle, of shape (angles, types)
+        flux (ndarray): Normalized flux density of shape (angles, grid points), nan where no type has coverage
+    """
+    angles = range(-90, 91)
+
+    def __init__(self, grid, nums, ranges, width=BLEND_WIDTH):
+        self.wave = grid.wave
+        self.nums = tuple(nums)
+        self.weights = blend_weights(self.angles, ranges, width)
+
+        spectra = grid.select(self.nums, normalize=True)
+        covered = np.isfinite(spectra)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.flux = (self.weights @ np.where(covered, spectra, 0)) / (self.weights @ covered.astype(np.float32))
+        for arr in (self.weights, self.flux):
+            arr.setflags(write=False)
+
+    def at(self, angle):
+        """
+        Method to get the blended spectrum of a viewing angle
+
+        Args:
+            angle (int or ndarray): Viewing angle in degrees, or several, rounded to the nearest integer
+
+        Returns:
+            (ndarray): read-only normalized flux density, one row per angle given
+        """
+        return self.flux[np.rint(angle).astype(int) - self.angles.start]
+
+    def mix(self, angle):
+        """
+        Method to get the types contributing to the spectrum of a viewing angle
+
+        Args:
+            angle (int): Viewing angle in degrees, rounded to the nearest integer
+
+        Returns:
+            (dict): weight of each contributing object, largest first
+        """
+        weights = self.weights[int(round(angle)) - self.angles.start]
+        order = np.argsort(-weights, kind='stable')
+        return {self.nums[i]: float(weights[i]) for i in order if weights[i] > 0}
+
+
+@lru_cache(maxsize=8)
+def get_blend(chosen=(), width=BLEND_WIDTH, path='assets/BASS_fits.zip/BASS_DR1_'):
+    """
+    Function that gives the cached viewing angle blend of the AGN types in TYPES
+
+    Args:
+        chosen (tuple): Pairs of AGN type and the object ID picked to stand in for it, every
+            other type stands in with its default object
+        width (float): Degrees the blend at each type boundary spans
+        path (str): Path prefix of fits files
+
+    Returns:
+        (AngleBlend): shared, read-only blend
+    """
+    cat = catalog.get_catalog(path)
+    chosen = dict(chosen)
+    nums, ranges = [], []
+    for low, high, agn_type, _, _ in catalog.TYPES:
+        nums.append(cat.example(agn_type, chosen)['num'])
+        ranges.append((low, high))
+    with metrics.timer('grid.blend'):
+        return AngleBlend(get_grid(path), nums, ranges, width)
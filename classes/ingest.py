@@ -0,0 +1,176 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import glob
+import json
+import os
+import re
+import uuid
+
+import numpy as np
+
+
+# Default location of the columnar spectrum store, as a prefix for its .npy and .json files
+COLUMNS = 'assets/BASS_spectra'
+
+
+def convert(file):
+    """
+    Function to read one BASS FITS file into native float32 wavelength and flux arrays
+
+    Args:
+        file (str): Path of FITS file, ending in the 4 digit object ID
+
+    Returns:
+        num (str): Swift BAT object ID number as a 4 digit string
+        wave (ndarray): rest wavelength without 0 values
+        flux (ndarray): flux density where rest wavelength is not 0
+    """
+    from . import fitsio
+    from .spectra import no_zero
+
+    num = re.search(r'(\d+)\.fits$', file).group(1)
+    _, data = fitsio.read_table(file)
+    wave, flux = no_zero(data['Rest-wavelength'], data['Flux density'])
+    return num, wave.astype(np.float32), flux.astype(np.float32)
+
+
+def ingest(path='assets/BASS_fits.zip/BASS_DR1_', out=COLUMNS, workers=None):
+    """
+    Function to convert every FITS file matching a path prefix into a single columnar store
+
+    The store is a float32 .npy array of shape (2, total points) holding wavelength and flux
+    of all objects back to back, and a .json index of each object's offset and length. The
+    array is named after a random token kept in the index, so replacing the index swaps the
+    pair in one step and an index is never read against another ingest's array.
+
+    Args:
+        path (str): Path prefix of fits files
+        out (str): Path prefix of the .npy and .json files to write
+        workers (int): Number of processes to convert files with, defaults to the number of CPUs
+
+    Returns:
+        index (dict): Path prefix, name of the array file and offset and length of each object in the store
+    """
+    files = sorted(glob.glob(glob.escape(path) + '*.fits'))
+    if not files:
+        raise FileNotFoundError('No FITS files match %s*.fits' % path)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        converted = list(pool.map(convert, files))
+
+    objects = {}
+    offset = 0
+    for num, wave, _ in converted:
+        objects[num] = [offset, len(wave)]
+        offset += len(wave)
+    data = np.empty((2, offset), dtype=np.float32)
+    for num, wave, flux in converted:
+        start, length = objects[num]
+        data[0, start:start + length] = wave
+        data[1, start:start + length] = flux
+
+    array = '%s.%s.npy' % (os.path.basename(out), uuid.uuid4().hex[:12])
+    file = os.path.join(os.path.dirname(out), array)
+    index = {'path': path, 'array': array, 'objects': objects}
+    os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+    # A new array file under its own name first, then the index pointing to it replaced atomically
+    with open(file + '.tmp', 'wb') as f:
+        np.save(f, data)
+    os.replace(file + '.tmp', file)
+    with open(out + '.json.tmp', 'w') as f:
+        json.dump(index, f)
+    os.replace(out + '.json.tmp', out + '.json')
+
+    # Arrays of earlier ingests stay readable by processes that already mapped them
+    for old in glob.glob(glob.escape(out) + '.*.npy'):
+        if os.path.basename(old) != array:
+            os.remove(old)
+    return index
+
+
+class Columns:
+    """
+    The Columns class reads spectra out of a columnar store written by ingest
+
+    The array is memory mapped read-only, so every spectrum is a zero-copy slice and
+    opening a store with many objects costs the same as one with a few.
+
+    Args:
+        out (str): Path prefix of the .npy and .json files
+
+    Raises:
+        OSError: if the array was removed by a later ingest since the index was read
+        ValueError: if the array does not have the points the index lists
+
+    Attributes:
+        path (str): Path prefix of the fits files the store was made from
+        objects (dict): Offset and length of each object in the store
+        data (ndarray): Memory mapped array of wavelength and flux
+    """
+    def __init__(self, out=COLUMNS):
+        with open(out + '.json') as f:
+            index = json.load(f)
+        self.path = index['path']
+        self.objects = index['objects']
+        array = os.path.join(os.path.dirname(out), index['array'])
+        self.data = np.load(array, mmap_mode='r')
+        total = sum(length for _, length in self.objects.values())
+        if self.data.shape != (2, total):
+            raise ValueError('%s does not match the index in %s.json' % (array, out))
+
+    def get(self, num):
+        """
+        Method to get the spectrum of an object as views into the store
+
+        Args:
+            num (str): Swift BAT object ID number as a 4 digit string
+
+        Returns:
+            wave (ndarray): read-only rest wavelength
+            flux (ndarray): read-only flux density
+        """
+        start, length = self.objects[num]
+        return self.data[0, start:start + length], self.data[1, start:start + length]
+
+    def __contains__(self, num):
+        return num in self.objects
+
+
+def open_columns(out=COLUMNS):
+    """
+    Function to open a columnar store if it has been created
+
+    Args:
+        out (str): Path prefix of the .npy and .json files
+
+    Returns:
+        (Columns): opened store, or None if it does not exist or its files do not match,
+        so spectra are read from their FITS files instead
+    """
+    if not os.path.exists(out + '.json'):
+        return None
+    try:
+        return Columns(out)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def main(argv=None):
+    """
+    Command line entry point to ingest a directory of BASS FITS files,
+    run as python -m classes ingest
+
+    Args:
+        argv (list): Command line arguments, defaults to sys.argv
+    """
+    parser = argparse.ArgumentParser(prog='python -m classes ingest',
+                                     description='Convert BASS DR1 FITS files into one columnar store')
+    parser.add_argument('--path', default='assets/BASS_fits.zip/BASS_DR1_', help='path prefix of FITS files')
+    parser.add_argument('--out', default=COLUMNS, help='path prefix of .npy and .json output')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes')
+    args = parser.parse_args(argv)
+
+    index = ingest(args.path, args.out, args.workers)
+    total = sum(length for _, length in index['objects'].values())
+    print('Ingested %d objects (%d points) into %s' % (len(index['objects']), total, index['array']))
+    return 0
@@ -0,0 +1,596 @@
+import argparse
+import json
+import os
+import threading
+
+import numpy as np
+
+
+# Speed of light in km/s
+C_KMS = 299792.458
+
+# Largest half width of the window a line is measured in, as a velocity around its rest wavelength
+MAX_KMS = 10000.0
+
+# Width of the continuum sideband on each side of a line, as a velocity
+CONTINUUM_KMS = 2000.0
+
+# Half width of the region around every other line left out of continuum sidebands, as a velocity
+MASK_KMS = 600.0
+
+# Fraction of its peak a line falls to, above the noise, where its window ends
+EDGE = 0.05
+
+# Width in Angstrom of the running median that line windows are found against, wide enough
+# that the wings of a broad line do not pull it up
+GUIDE_WIDTH = 1000.0
+
+
+def masked(wave, centers, mask_kms=MASK_KMS):
+    """
+    Function that marks the pixels close to any of several lines, all lines at once
+
+    Args:
+        wave (ndarray): rest wavelength of spectrum, in increasing order
+        centers (ndarray): Rest wavelength in Angstrom of each line
+        mask_kms (float): Half width of the region around each line in km/s
+
+    Returns:
+        (ndarray): boolean array, True within mask_kms of a line
+    """
+    centers = np.asarray(centers, dtype=np.float64)
+    half = centers * mask_kms / C_KMS
+    # +1 where a region starts and -1 where it ends, so a running sum counts the regions covering each pixel
+    edges = np.zeros(len(wave) + 1, dtype=np.int64)
+    np.add.at(edges, np.searchsorted(wave, centers - half), 1)
+    np.add.at(edges, np.searchsorted(wave, centers + half, side='right'), -1)
+    return np.cumsum(edges[:-1]) > 0
+
+
+def windows(wave, flux, centers, max_kms=MAX_KMS, edge=EDGE):
+    """
+    Function that finds the pixels every line spans, sized from the line itself
+
+    A line's window is searched within max_kms of its rest wavelength, but never past the
+    midpoint to the lines next to it. From its highest point near the rest wavelength, it
+    reaches out on either side to where the lightly smoothed flux above a GUIDE_WIDTH running
+    median continuum falls to edge times the peak, or to the noise if that is higher. Narrow lines
+    get narrow windows and broad lines windows wide enough for their wings.
+
+    Args:
+        wave (ndarray): rest wavelength of spectrum in Angstrom, in increasing order
+        flux (ndarray): flux density
+        centers (ndarray): Rest wavelength in Angstrom of each line, in increasing order
+        max_kms (float): Largest half width of line windows in km/s
+        edge (float): Fraction of the peak where a window ends
+
+    Returns:
+        low (ndarray): index of the first pixel of each line's window
+        high (ndarray): index after the last pixel of each line's window
+    """
+    centers = np.asarray(centers, dtype=np.float64)
+    continuum, noise = baseline(wave, flux, GUIDE_WIDTH)
+    smooth = np.convolve(flux - continuum, np.ones(3) / 3, mode='same')
+
+    # Search range of each line, clipped at the midpoints to its neighbours
+    mid = (centers[1:] + centers[:-1]) / 2
+    reach = centers * max_kms / C_KMS
+    start = np.searchsorted(wave, np.maximum(centers - reach, np.r_[-np.inf, mid]))
+    stop = np.searchsorted(wave, np.minimum(centers + reach, np.r_[mid, np.inf]))
+
+    pos = np.arange(max(int((stop - start).max()) if len(centers) else 0, 1))
+    idx = np.minimum(start[:, None] + pos, len(wave) - 1)
+    inside = start[:, None] + pos < stop[:, None]
+    y = np.where(inside, smooth[idx], -np.inf)
+
+    # Highest point within the match tolerance of the rest wavelength
+    near = inside & (np.abs(wave[idx] - centers[:, None]) <= (centers * MATCH_KMS / C_KMS)[:, None])
+    rows = np.arange(len(centers))
+    peak_pos = np.where(near, y, -np.inf).argmax(axis=1)
+    peak = y[rows, peak_pos]
+    level = np.maximum(edge * peak, noise[idx[rows, peak_pos]])
+    below = ~inside | (y <= level[:, None])
+    left = np.where(below & (pos < peak_pos[:, None]), pos, -1).max(axis=1)
+    right = np.where(below & (pos > peak_pos[:, None]), pos, len(pos)).min(axis=1)
+    # The pixels where the line reaches the edge are still part of it
+    low = start + np.maximum(left, 0)
+    high = np.minimum(start + right + 1, stop)
+    found = near.any(axis=1) & (peak > 0)
+    return np.where(found, low, start), np.where(found, high, start)
+
+
+def measure(wave, flux, centers, mask=None, max_kms=MAX_KMS, continuum_kms=CONTINUUM_KMS, mask_kms=MASK_KMS):
+    """
+    Function that measures the flux, equivalent width and FWHM of several emission lines in one pass
+
+    Each line is measured within its own window (see windows), so broad lines keep their
+    wings and lines next to each other are split at their midpoint instead of measured as
+    one blend. The pixels around every line are gathered into one padded (lines, pixels)
+    matrix, so the continuum of all lines is fitted at once by closed-form least squares
+    through sidebands of continuum_kms either side of the window, as a straight line if
+    both sidebands have pixels and as a constant otherwise. Pixels within mask_kms of any
+    line of mask are left out of the sidebands. FWHM is measured between the points where
+    the continuum-subtracted flux falls to half its peak on either side, interpolated
+    between pixels, or as twice the distance from the peak to one of them when the line
+    is still above half where its window meets a neighbour. Lines outside the spectrum, without continuum, without a positive peak
+    or with no positive flux above the continuum are nan.
+
+    Args:
+        wave (ndarray): rest wavelength of spectrum in Angstrom, in increasing order
+        flux (ndarray): flux density in erg/cm^2/s/A
+        centers (ndarray): Rest wavelength in Angstrom of each line, in increasing order
+        mask (ndarray): Rest wavelength in Angstrom of lines kept out of sidebands, defaults to centers
+        max_kms (float): Largest half width of line windows in km/s
+        continuum_kms (float): Width of each continuum sideband in km/s
+        mask_kms (float): Half width of the region around each line of mask in km/s
+
+    Returns:
+        (dict): float64 arrays of line flux in erg/cm^2/s 'flux', equivalent width in Angstrom 'ew',
+        FWHM in km/s 'fwhm' and continuum flux density at the line in erg/cm^2/s/A 'continuum'
+    """
+    wave = np.asarray(wave, dtype=np.float64)
+    flux = np.asarray(flux, dtype=np.float64)
+    centers = np.asarray(centers, dtype=np.float64)
+    nan = np.full(len(centers), np.nan)
+    if len(wave) < 7 or not len(centers):
+        return {'flux': nan, 'ew': nan.copy(), 'fwhm': nan.copy(), 'continuum': nan.copy()}
+    low, high = windows(wave, flux, centers, max_kms)
+    side = centers * continuum_kms / C_KMS
+    blue = np.searchsorted(wave, wave[np.minimum(low, len(wave) - 1)] - side)
+    red = np.searchsorted(wave, wave[np.maximum(high - 1, 0)] + side, side='right')
+    excluded = masked(wave, centers if mask is None else mask, mask_kms)
+
+    # Pixels of every line's sidebands and window, padded to the longest and masked
+    pos = np.arange(max(int((red - blue).max()), 1))
+    idx = blue[:, None] + pos
+    good = idx < red[:, None]
+    idx = np.minimum(idx, len(wave) - 1)
+    x = wave[idx] - centers[:, None]
+    y = flux[idx]
+    good &= np.isfinite(y)
+    core = good & (idx >= low[:, None]) & (idx < high[:, None])
+    side = good & ~core & ~excluded[idx]
+    blue_n = (side & (idx < low[:, None])).sum(axis=1)
+    red_n = (side & (idx >= high[:, None])).sum(axis=1)
+
+    # Continuum through the sidebands, with x centred on the line so its level at the line is the intercept
+    with np.errstate(divide='ignore', invalid='ignore'):
+        n = side.sum(axis=1)
+        sx = np.where(side, x, 0).sum(axis=1)
+        sy = np.where(side, y, 0).sum(axis=1)
+        sxx = np.where(side, x * x, 0).sum(axis=1)
+        sxy = np.where(side, x * y, 0).sum(axis=1)
+        det = n * sxx - sx * sx
+        slope = np.where((blue_n >= 2) & (red_n >= 2) & (det > 0), (n * sxy - sx * sy) / det, 0)
+        level = (sy - slope * sx) / n
+        resid = y - (level[:, None] + slope[:, None] * x)
+
+        dw = np.gradient(wave)[idx]
+        line_flux = np.where(core, resid * dw, 0).sum(axis=1)
+        ew = line_flux / level
+
+        # Half maximum crossings either side of the peak, from the last pixel below half on each side
+        rows = np.arange(len(centers))
+        peak_pos = np.where(core, resid, -np.inf).argmax(axis=1)
+        half = resid[rows, peak_pos] / 2
+        below = core & (resid < half[:, None])
+        left = np.where(below & (pos < peak_pos[:, None]), pos, -1).max(axis=1)
+        right = np.where(below & (pos > peak_pos[:, None]), pos, len(pos)).min(axis=1)
+        found_left, found_right = left >= 0, right < len(pos)
+        left, right = np.clip(left, 0, len(pos) - 2), np.clip(right, 1, len(pos) - 1)
+
+        def crossing(i, j):
+            # Linear interpolation of where resid passes half between pixels i and j
+            xi, xj = x[rows, i], x[rows, j]
+            ri, rj = resid[rows, i], resid[rows, j]
+            return xi + (half - ri) * (xj - xi) / (rj - ri)
+
+        # A line still above half where its window meets a neighbour is taken as symmetric about its peak
+        peak_x = x[rows, peak_pos]
+        blue_half = np.where(found_left, peak_x - crossing(left, left + 1), crossing(right, right - 1) - peak_x)
+        red_half = np.where(found_right, crossing(right, right - 1) - peak_x, blue_half)
+        fwhm = C_KMS * (blue_half + red_half) / centers
+
+    valid = (n >= 2) & (core.sum(axis=1) >= 3) & (line_flux > 0)
+    fwhm = np.where(valid & (found_left | found_right) & (half > 0), fwhm, np.nan)
+    return {'flux': np.where(valid, line_flux, np.nan), 'ew': np.where(valid & (level > 0), ew, np.nan),
+            'fwhm': fwhm, 'continuum': np.where(valid, level, np.nan)}
+
+
+# Rest wavelength in Angstrom and label of every emission line features are identified as
+MASTER = {
+    'Ne5': (3425.881, '[NeV]'),
+    'O2a': (3726.032, '[OIIa]'),
+    'O2b': (3728.815, '[OIIb]'),
+    'Ne3': (3868.760, '[NeIII]'),
+    'H-epsilon': (3970.079, 'Hε'),
+    'H-delta': (4101.742, 'Hδ'),
+    'Fe5': (4180.600, '[FeV]'),
+    'H-gamma': (4340.471, 'Hγ'),
+    'O3': (4363.210, '[OIII]'),
+    'He1a': (4471.479, 'He I'),
+    'He2': (4685.710, 'He II'),
+    'H-beta': (4861.333, 'Hβ'),
+    'O3a': (4958.911, '[OIIIa]'),
+    'O3b': (5006.843, '[OIIIb]'),
+    'Fe2a': (5169.033, 'Fe II'),
+    'N1': (5200.257, '[NI]'),
+    'Fe2b': (5276.002, '[FeII]'),
+    'Cl3a': (5517.709, '[ClIIIa]'),
+    'Cl3b': (5537.873, '[ClIIIb]'),
+    'He1b': (5877.250, 'He I'),
+    'Fe7': (6087.000, '[FeVII]'),
+    'O1a': (6300.304, '[OIa]'),
+    'O1b': (6363.776, '[OIb]'),
+    'Fe10': (6374.510, '[FeX]'),
+    'N2a': (6548.050, '[NIIa]'),
+    'H-alpha': (6562.819, 'Hα'),
+    'N2b': (6585.230, '[NIIb]'),
+    'S2a': (6716.440, '[SIIa]'),
+    'S2b': (6730.810, '[SIIb]'),
+    'He1c': (7065.196, 'He I'),
+    'Ar3': (7135.790, '[ArIII]'),
+    'O2c': (7330.730, '[OII]'),
+}
+
+# Width in Angstrom of the running median taken as the continuum, wider than the broadest lines
+DETECT_WIDTH = 300.0
+
+# Peak height above the continuum and prominence, in units of the local noise, for a feature to count as detected
+DETECT_SNR = 5.0
+
+# Velocity within which BASS spectra do not resolve two peaks, so only the strongest is a feature
+RESOLUTION_KMS = 300.0
+
+# Largest velocity between a detected peak and a line of MASTER for the peak to be identified as that line
+MATCH_KMS = 400.0
+
+# Default location of the persisted line index
+INDEX = 'assets/BASS_lines.json'
+
+
+def running_median(x, size):
+    """
+    Function that gives the median of x in a window of size points around every point
+
+    Medians are taken on a grid of an eighth of the window and interpolated in between,
+    all windows of the grid at once
+
+    Args:
+        x (ndarray): values, such as a flux density
+        size (int): Number of points in window
+
+    Returns:
+        (ndarray): running median of the same length as x
+    """
+    size = max(min(size, len(x)), 1)
+    step = max(size // 8, 1)
+    medians = np.median(np.lib.stride_tricks.sliding_window_view(x, size)[::step], axis=1)
+    return np.interp(np.arange(len(x)), np.arange(len(medians)) * step + (size - 1) / 2, medians)
+
+
+def baseline(wave, flux, width=DETECT_WIDTH):
+    """
+    Function that estimates the continuum and noise of a spectrum without being pulled up by its lines
+
+    The continuum is a running median over width, and the noise a running median of the
+    DER_SNR estimator (Stoehr et al. 2008).
+
+    Args:
+        wave (ndarray): rest wavelength of spectrum in Angstrom, in increasing order
+        flux (ndarray): flux density
+        width (float): Width in Angstrom of continuum and noise windows
+
+    Returns:
+        continuum (ndarray): continuum flux density at every pixel
+        noise (ndarray): standard deviation of the noise at every pixel
+    """
+    size = int(width / float(np.median(np.diff(wave)))) | 1
+    der = np.abs(2 * flux[2:-2] - flux[:-4] - flux[4:])
+    return running_median(flux, size), 0.6052697 * running_median(np.pad(der, 2, mode='edge'), size)
+
+
+def prominence(y, ind):
+    """
+    Function that finds how far peaks stand above the ground separating them from higher peaks
+
+    As for mountains, a peak's base on each side is the lowest point before the nearest
+    higher point or the end of y, and its prominence is its height above the higher of the
+    two bases. A wiggle on top of a broad line is only as prominent as its dip, however
+    high the line lifts it. All peaks are compared with all points in one (peaks, points)
+    pass, which stays small as only peaks above the noise are given.
+
+    Args:
+        y (ndarray): values, such as continuum-subtracted flux
+        ind (ndarray): index of each peak in y
+
+    Returns:
+        (ndarray): prominence of each peak, in the units of y
+    """
+    ind = np.asarray(ind, dtype=int)
+    pos = np.arange(len(y))
+    # Every peak against every point at once, True where the point is higher than the peak
+    higher = y[None, :] > y[ind, None]
+    left = np.where(higher & (pos < ind[:, None]), pos, -1).max(axis=1)
+    right = np.where(higher & (pos > ind[:, None]), pos, len(y)).min(axis=1)
+    base = np.maximum(np.where((pos > left[:, None]) & (pos <= ind[:, None]), y, np.inf).min(axis=1),
+                      np.where((pos >= ind[:, None]) & (pos < right[:, None]), y, np.inf).min(axis=1))
+    return y[ind] - base
+
+
+def centroid(x, y, ind, depth):
+    """
+    Function that finds the centre of peaks as the centroid of their tops
+
+    The top of a peak is the run of points around it higher than depth below the peak,
+    weighted by their height above that level. It follows the middle of a broad line,
+    where its highest point wanders across the flat top with the noise. All tops are found
+    and weighted in one (peaks, points) pass.
+
+    Args:
+        x (ndarray): positions of the points, such as wavelength
+        y (ndarray): values, such as continuum-subtracted flux
+        ind (ndarray): index of each peak in y
+        depth (ndarray): depth of the top of each peak, in the units of y
+
+    Returns:
+        (ndarray): centroid of each peak, in the units of x
+    """
+    ind = np.asarray(ind, dtype=int)
+    pos = np.arange(len(y))
+    level = y[ind] - depth
+    # Every peak against every point at once, True where the point is not above the peak's top
+    below = y[None, :] <= level[:, None]
+    low = np.where(below & (pos < ind[:, None]), pos, -1).max(axis=1) + 1
+    high = np.where(below & (pos >= ind[:, None]), pos, len(y)).min(axis=1)
+    weight = np.where((pos >= low[:, None]) & (pos < high[:, None]), y[None, :] - level[:, None], 0)
+    return (weight @ x) / weight.sum(axis=1)
+
+
+def detect(wave, flux, width=DETECT_WIDTH, snr=DETECT_SNR, separation=RESOLUTION_KMS):
+    """
+    Function that finds significant emission features in a spectrum
+
+    The continuum is a running median over width, and the noise a running median of the
+    DER_SNR estimator (Stoehr et al. 2008), so both follow the spectrum without being pulled
+    up by the lines. Features are local maxima of the lightly smoothed continuum-subtracted
+    flux in units of the noise that stand more than snr above both the continuum and their
+    bases (see prominence), and are the strongest maximum within separation of them, so
+    noise on a broad line and the two halves of an unresolved doublet give one feature.
+    Each feature is placed at the centroid of its top (see centroid).
+
+    Args:
+        wave (ndarray): rest wavelength of spectrum in Angstrom, in increasing order
+        flux (ndarray): flux density
+        width (float): Width in Angstrom of continuum and noise windows
+        snr (float): Smallest peak height and prominence in units of the noise
+        separation (float): Velocity in km/s within which only the strongest maximum is a feature
+
+    Returns:
+        peaks (ndarray): rest wavelength of each feature's centroid, in increasing order
+        significance (ndarray): peak height of each feature in units of the noise
+    """
+    wave = np.asarray(wave, dtype=np.float64)
+    flux = np.asarray(flux, dtype=np.float64)
+    if len(wave) < 7:
+        return np.zeros(0), np.zeros(0)
+    continuum, noise = baseline(wave, flux, width)
+    resid = flux - continuum
+
+    smooth = np.convolve(resid, np.ones(3) / 3, mode='same')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        significance = np.where(noise > 0, smooth / noise, 0)
+    peak = np.zeros(len(wave), dtype=bool)
+    peak[1:-1] = (significance[1:-1] > significance[:-2]) & (significance[1:-1] >= significance[2:])
+    ind = np.flatnonzero(peak & (significance > snr))
+
+    # Non-maximum suppression, strongest first, within the velocity separation
+    kept = []
+    for i in ind[np.argsort(-significance[ind], kind='stable')]:
+        if not kept or np.abs(wave[kept] - wave[i]).min() > wave[i] * separation / C_KMS:
+            kept.append(i)
+    ind = np.sort(np.array(kept, dtype=int))
+    prom = prominence(significance, ind)
+    ind, prom = ind[prom > snr], prom[prom > snr]
+    # The top a feature is placed by is what lies within noise of its peak, or its upper half if less prominent
+    return centroid(wave, significance, ind, np.minimum(prom / 2, 2)), significance[ind]
+
+
+def match(peaks, significance, centers, tolerance=MATCH_KMS, separation=RESOLUTION_KMS):
+    """
+    Function that identifies detected features with lines of a line list
+
+    Every feature is matched to its nearest line, and every line keeps its most significant
+    feature within tolerance. Features within separation of a more significant feature are
+    taken as part of its blend, and not identified with a line of their own.
+
+    Args:
+        peaks (ndarray): rest wavelength of each feature's peak
+        significance (ndarray): peak height of each feature in units of the noise
+        centers (ndarray): Rest wavelength of each line of the list, in increasing order
+        tolerance (float): Largest velocity in km/s between a feature and its line
+        separation (float): Velocity in km/s within which features belong to one blend
+
+    Returns:
+        (ndarray): index into peaks of the feature identified with each line, -1 for lines not detected
+    """
+    centers = np.asarray(centers, dtype=np.float64)
+    peaks = np.asarray(peaks, dtype=np.float64)
+    significance = np.asarray(significance, dtype=np.float64)
+    found = np.full(len(centers), -1)
+    if not len(peaks) or not len(centers):
+        return found
+    right = np.clip(np.searchsorted(centers, peaks), 1, len(centers) - 1)
+    left = right - 1
+    nearest = np.where(np.abs(peaks - centers[left]) <= np.abs(peaks - centers[right]), left, right)
+    close = C_KMS * np.abs(peaks - centers[nearest]) / centers[nearest] <= tolerance
+    ind = np.flatnonzero(close)
+    # Most significant feature of each line first, then the first of every line
+    ind = ind[np.lexsort((-significance[ind], nearest[ind]))]
+    first = np.diff(nearest[ind], prepend=-1) != 0
+    found[nearest[ind][first]] = ind[first]
+
+    # Lines whose feature is in the blend of a feature already identified with a stronger line are refused
+    kept = []
+    for line in sorted(np.flatnonzero(found >= 0), key=lambda line: -significance[found[line]]):
+        j = found[line]
+        if kept and np.abs(peaks[found[kept]] - peaks[j]).min() <= peaks[j] * separation / C_KMS:
+            found[line] = -1
+        else:
+            kept.append(line)
+    return found
+
+
+def scan(path='assets/BASS_fits.zip/BASS_DR1_'):
+    """
+    Function to detect and identify the emission lines of every object in the catalog
+
+    Args:
+        path (str): Path prefix of fits files
+
+    Returns:
+        (dict): lines of each object by Swift BAT object ID number, each a list of the line's key in
+        MASTER, detected peak wavelength and significance, in order of wavelength
+    """
+    from . import catalog
+    from .store import store
+
+    keys = sorted(MASTER, key=lambda key: MASTER[key][0])
+    centers = np.array([MASTER[key][0] for key in keys])
+    objects = {}
+    for rec in catalog.get_catalog(path).records:
+        peaks, significance = detect(*store.get(rec['num'], path))
+        found = match(peaks, significance, centers)
+        objects[rec['num']] = [{'key': keys[i], 'peak': round(float(peaks[j]), 2),
+                                'snr': round(float(significance[j]), 1)} for i, j in enumerate(found) if j >= 0]
+    return objects
+
+
+class LineIndex:
+    """
+    The LineIndex class looks up the emission lines detected in each BASS object
+
+    Markers and labels come from the index, so every object shows the lines it actually
+    has, with the rest wavelength and label of MASTER.
+
+    Args:
+        objects (dict): lines of each object, as made by scan
+        path (str): Path prefix of fits files the index was made from
+
+    Attributes:
+        objects (dict): lines of each object
+        path (str): Path prefix of fits files the index was made from
+    """
+    def __init__(self, objects, path='assets/BASS_fits.zip/BASS_DR1_'):
+        self.objects = objects
+        self.path = path
+
+    def lines(self, num):
+        """
+        Method to get the emission lines detected in an object
+
+        Args:
+            num (str): Swift BAT object ID number as a 4 digit string
+
+        Returns:
+            (dict): rest wavelength and label of each line by key in MASTER, in order of wavelength,
+            empty for objects not in the index
+        """
+        return {line['key']: MASTER[line['key']] for line in self.objects.get(num, ())}
+
+    def save(self, index=INDEX):
+        """
+        Method to persist the index as JSON, with the line list it was matched against
+
+        Args:
+            index (str): Path of JSON file
+        """
+        tmp = index + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'path': self.path, 'master': MASTER, 'objects': self.objects}, f, indent=1, ensure_ascii=False)
+        os.replace(tmp, index)
+
+    @classmethod
+    def load(cls, index=INDEX):
+        """
+        Method to read a persisted index
+
+        Args:
+            index (str): Path of JSON file
+
+        Returns:
+            (LineIndex): index read from the file, or None if it was matched against another line list
+        """
+        with open(index) as f:
+            data = json.load(f)
+        if {key: tuple(line) for key, line in data['master'].items()} != MASTER:
+            return None
+        return cls(data['objects'], data['path'])
+
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def get_line_index(path='assets/BASS_fits.zip/BASS_DR1_', index=INDEX):
+    """
+    Function to get the shared line index of a path prefix, detecting and persisting it on first use
+
+    A persisted index is rebuilt when MASTER changes, but not when FITS files are added,
+    rebuild it with python -m classes lines instead
+
+    Args:
+        path (str): Path prefix of fits files
+        index (str): Path of JSON file the index is persisted in
+
+    Returns:
+        (LineIndex): shared index
+    """
+    with _lock:
+        if path in _indexes:
+            return _indexes[path]
+        existing = LineIndex.load(index) if os.path.exists(index) else None
+        if existing is not None and existing.path == path:
+            line_index = existing
+        else:
+            line_index = LineIndex(scan(path), path)
+            # Never overwrite an index made for other files, and work on read-only installs
+            if existing is None:
+                try:
+                    line_index.save(index)
+                except OSError:
+                    pass
+        _indexes[path] = line_index
+        return line_index
+
+
+def _clear():
+    with _lock:
+        _indexes.clear()
+
+
+# Forgets every shared instance, as with functools.lru_cache, so the next call reads the persisted index again
+get_line_index.cache_clear = _clear
+
+
+def main(argv=None):
+    """
+    Command line entry point to rebuild the line index and print it, run as python -m classes lines
+
+    Args:
+        argv (list): Command line arguments, defaults to sys.argv
+    """
+    parser = argparse.ArgumentParser(prog='python -m classes lines',
+                                     description='Detect emission lines in every BASS spectrum into the line index')
+    parser.add_argument('--path', default='assets/BASS_fits.zip/BASS_DR1_', help='path prefix of FITS files')
+    parser.add_argument('--index', default=INDEX, help='JSON file to write')
+    args = parser.parse_args(argv)
+
+    line_index = LineIndex(scan(args.path), args.path)
+    line_index.save(args.index)
+    with _lock:
+        _indexes[args.path] = line_index
+
+    for num, lines in line_index.objects.items():
+        print('%-5s %s' % (num, ' '.join('%s(%.0f)' % (MASTER[line['key']][1], line['snr']) for line in lines)))
+    return 0
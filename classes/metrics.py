@@ -0,0 +1,165 @@
+from contextlib import contextmanager
+from functools import wraps
+import json
+import logging
+import threading
+import time
+
+
+class Registry:
+    """
+    The Registry class collects stage timings and cache counters of the running process
+
+    Every timed stage keeps a count, total and maximum duration. Streamlit runs each
+    session's script in its own thread, so stages are also recorded in a per-thread trace
+    that holds the breakdown of the rerun in progress.
+
+    Attributes:
+        stages (dict): Count, total seconds and maximum seconds of each timed stage
+        counters (dict): Value of each counter, such as cache hits and misses
+    """
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def record(self, stage, seconds):
+        """
+        Method to add one duration of a stage
+
+        Args:
+            stage (str): Name of stage, such as 'agn.rotate'
+            seconds (float): Duration in seconds
+        """
+        with self._lock:
+            stat = self.stages.setdefault(stage, {'count': 0, 'total': 0.0, 'max': 0.0})
+            stat['count'] += 1
+            stat['total'] += seconds
+            stat['max'] = max(stat['max'], seconds)
+        trace = getattr(self._local, 'trace', None)
+        if trace is not None:
+            trace.append((stage, seconds))
+
+    @contextmanager
+    def timer(self, stage):
+        """
+        Method to time the body of a with statement as a stage
+
+        Args:
+            stage (str): Name of stage
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def timed(self, stage):
+        """
+        Method to make a decorator timing every call of a function as a stage
+
+        Args:
+            stage (str): Name of stage
+
+        Returns:
+            (callable): decorator
+        """
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer(stage):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, name, n=1):
+        """
+        Method to increase a counter
+
+        Args:
+            name (str): Name of counter, such as 'spectrum_store.hits'
+            n (int): Amount to increase by
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def begin(self):
+        """
+        Method to start recording the stage breakdown of a rerun in the current thread
+
+        Returns:
+            trace (list): stage names and durations in seconds, filled in as stages run
+        """
+        self._local.trace = []
+        return self._local.trace
+
+    def end(self):
+        """
+        Method to stop recording the stage breakdown of the current thread
+
+        Returns:
+            trace (list): stage names and durations in seconds recorded since begin
+        """
+        trace = getattr(self._local, 'trace', None)
+        self._local.trace = None
+        return trace or []
+
+    def snapshot(self):
+        """
+        Method to copy the current stage timings and counters
+
+        Returns:
+            (dict): stages and counters
+        """
+        with self._lock:
+            return {'stages': {stage: dict(stat) for stage, stat in self.stages.items()},
+                    'counters': dict(self.counters)}
+
+    def prometheus(self):
+        """
+        Method to export the metrics in the Prometheus text exposition format
+
+        Returns:
+            (str): metrics text
+        """
+        snap = self.snapshot()
+        out = ['# HELP agnite_stage_seconds Time spent in each render stage',
+               '# TYPE agnite_stage_seconds summary']
+        for stage, stat in sorted(snap['stages'].items()):
+            out.append('agnite_stage_seconds_sum{stage="%s"} %.9g' % (stage, stat['total']))
+            out.append('agnite_stage_seconds_count{stage="%s"} %d' % (stage, stat['count']))
+        out += ['# HELP agnite_stage_seconds_max Longest time spent in each render stage',
+                '# TYPE agnite_stage_seconds_max gauge']
+        for stage, stat in sorted(snap['stages'].items()):
+            out.append('agnite_stage_seconds_max{stage="%s"} %.9g' % (stage, stat['max']))
+        for name, value in sorted(snap['counters'].items()):
+            metric = 'agnite_' + name.replace('.', '_').replace('-', '_') + '_total'
+            out += ['# TYPE %s counter' % metric, '%s %d' % (metric, value)]
+        return '\n'.join(out) + '\n'
+
+    def log(self, logger=None, level=logging.INFO):
+        """
+        Method to write the metrics as one JSON log line
+
+        Args:
+            logger (Logger): Logger to write to, defaults to the 'agnite.metrics' logger
+            level (int): Logging level
+        """
+        logger = logger or logging.getLogger('agnite.metrics')
+        logger.log(level, json.dumps(self.snapshot(), sort_keys=True))
+
+    def reset(self):
+        """
+        Method to clear all stage timings and counters
+        """
+        with self._lock:
+            self.stages.clear()
+            self.counters.clear()
+
+
+# Shared registry of the process
+registry = Registry()
+timer = registry.timer
+timed = registry.timed
+count = registry.count
@@ -1,6 +1,18 @@
+from collections import OrderedDict
+import io
+import threading
+
 import numpy as np
 from PIL import Image
 
+from . import metrics
+
+
+# Radius of the arrow's orbit relative to the full size image, and display width of the sidebar model
+RADIUS = 910
+# 600 px covers the sidebar at 2x pixel density, and ~40 kB per frame keeps all 181 frames cheap
+WIDTH = 600
+
 
 class Model:
     """
@@ -8,41 +20,53 @@ class Model:
 
     Args:
         angle (int): Viewing angle in degrees
-        r (int): Radius of image in pixels
+        r (int): Radius of image in pixels, relative to the full size image
+        width (int): Display width in pixels to downscale the image and arrow to once, or None for full size
 
     Attributes:
         angle (int): Viewing angle in degrees
-        r (int): Radius of image in pixels
+        r (int): Radius of image in pixels, at display size
+        scale (float): Ratio of display size to full image size
+        base_im (PIL Image): Decoded AGN model image at display size
         im (PIL Image): Simple AGN model image
+        base_arrow (PIL Image): Unrotated arrow image that every rotation starts from
         arrow (PIL Image): Arrow image used for representing viewing angle
         rad (float): Viewing angle in radians
         x (int): x coordinate in pixels for arrow to be pasted on image
         y (int): y coordinate in pixels for arrow to be pasted on image
     """
-    def __init__(self, angle=0, r=1220):
-        self.im = Image.open('assets/agn.png')
-        self.arrow = Image.open('assets/arrow.webp').rotate(180, expand=True)
-        self.arrow = self.arrow.resize((int(.7 * self.arrow.size[0]), int(.7 * self.arrow.size[1])))
+    def __init__(self, angle=0, r=1220, width=None):
+        self.base_im = Image.open('assets/agn.png')
+        self.base_im.load()
+        full_x, full_y = self.base_im.size
+        self.scale = 1 if width is None else width / full_x
+        if self.scale != 1:
+            self.base_im = self.base_im.resize((width, round(full_y * self.scale)), Image.LANCZOS)
+        self.im = self.base_im
+
+        self.base_arrow = Image.open('assets/arrow.webp').rotate(180, expand=True)
+        self.base_arrow = self.base_arrow.resize((max(int(.7 * self.scale * self.base_arrow.size[0]), 1),
+                                                  max(int(.7 * self.scale * self.base_arrow.size[1]), 1)),
+                                                 Image.LANCZOS)
         self.angle = angle
-        self.arrow = self.arrow.rotate(self.angle, expand=True)
-        self.r = r
-        self.center_x = self.im.size[0] // 4 + 57
-        self.center_y = self.im.size[1] // 2 - 100
+        self.arrow = self.base_arrow.rotate(self.angle, expand=True)
+        self.r = r * self.scale
+        self.center_x = round((full_x // 4 + 57) * self.scale)
+        self.center_y = round((full_y // 2 - 100) * self.scale)
 
         self.rad = np.radians(self.angle)
         # self.x = int(r * np.cos(self.rad))
         # self.y = int(r * np.sin(self.rad))
-        self.x = self.center_x + int(r * np.cos(self.rad))
-        self.y = self.center_y - int(r * np.sin(self.rad))
+        self.x = self.center_x + int(self.r * np.cos(self.rad))
+        self.y = self.center_y - int(self.r * np.sin(self.rad))
 
     def refresh(self):
         """
         Function that resets the im and arrow attributes to default after
         changing through pasting or rotation
         """
-        self.im = Image.open('assets/agn.png')
-        self.arrow = Image.open('assets/arrow.webp').rotate(180, expand=True)
-        self.arrow = self.arrow.resize((int(.7 * self.arrow.size[0]), int(.7 * self.arrow.size[1])))
+        self.im = self.base_im
+        self.arrow = self.base_arrow
 
     def rotate(self, angle):
         """
@@ -55,19 +79,31 @@ class Model:
         Returns:
             pos (tuple): New x and y coordinates in pixels to paste arrow in tuple format
         """
-        r = self.r
         self.angle = angle
-        self.arrow = self.arrow.rotate(angle, expand=True)
+        self.arrow = self.turn(angle)
         self.rad = np.radians(self.angle)
-        x = self.center_x + int(r * np.cos(self.rad))
-        y = self.center_y - int(r * np.sin(self.rad))
-        self.x, self.y = x, y
-        pos = (x, y)
+        pos = self.position(angle)
+        self.x, self.y = pos
         return pos
 
+    def position(self, angle):
+        """
+        Function that gives the pasting coordinates for a viewing angle without changing attributes
+
+        Args:
+            angle (int): Viewing angle in degrees
+
+        Returns:
+            pos (tuple): x and y coordinates in pixels to paste arrow in tuple format
+        """
+        rad = np.radians(angle)
+        x = self.center_x + int(self.r * np.cos(rad))
+        y = self.center_y - int(self.r * np.sin(rad))
+        return x, y
+
     def turn(self, angle):
         """
-        Function to turn arrow
+        Function to turn the unrotated arrow, so rotations never accumulate
 
         Args:
             angle (int): Viewing angle in degrees
@@ -75,8 +111,9 @@ class Model:
         Returns:
             (PIL Image): Rotated arrow
         """
-        return self.arrow.rotate(angle, expand=True)
+        return self.base_arrow.rotate(angle, expand=True)
 
+    @metrics.timed('model.paste')
     def paste(self, angle):
         """
         Function to paste arrow onto image and return new combined image
@@ -88,12 +125,109 @@ class Model:
             new_im (PIL Image): new image with arrow pasted
 
         """
-        pos = self.rotate(angle)
-        new_im = self.im.copy()
-        x, y = pos
-        new_im.paste(self.arrow, pos, self.arrow)
+        self.rotate(angle)
+        return self.render(angle)
+
+    def render(self, angle):
+        """
+        Function to composite the arrow for a viewing angle onto a copy of the image
+        without changing attributes, so one Model can be shared between threads
+
+        Args:
+            angle (int): Viewing angle in degrees
+
+        Returns:
+            new_im (PIL Image): new image with arrow pasted
+        """
+        arrow = self.turn(angle)
+        new_im = self.base_im.copy()
+        new_im.paste(arrow, self.position(angle), arrow)
         return new_im
 
+    def encode(self, angle, format='WEBP', **params):
+        """
+        Function to render the image for a viewing angle as compressed bytes that can be served as is
+
+        Args:
+            angle (int): Viewing angle in degrees
+            format (str): PIL image format, such as 'WEBP' or 'PNG'
+            **params: Extra options for PIL's Image.save, such as quality
+
+        Returns:
+            (bytes): encoded image with arrow pasted
+        """
+        if format.upper() == 'WEBP':
+            params.setdefault('quality', 85)
+            params.setdefault('method', 4)
+        elif format.upper() == 'PNG':
+            params.setdefault('optimize', True)
+        buf = io.BytesIO()
+        self.render(angle).save(buf, format=format, **params)
+        return buf.getvalue()
+
+
+class Frames:
+    """
+    The Frames class stores composited model images for every integer viewing angle
+
+    Frames are rendered from the unrotated arrow of a shared Model, either all at once
+    or on first use, and kept in a thread-safe least recently used cache so a change of
+    angle is a lookup instead of a rotate and composite. When a format is given, frames
+    are stored as encoded bytes instead of PIL images.
 
+    Args:
+        model (Model): Model to render frames from
+        eager (bool): Render all frames from -90 to 90 degrees immediately
+        maxsize (int): Maximum number of frames to keep in memory
+        format (str): PIL image format to encode frames with, or None to keep PIL images
+
+    Attributes:
+        model (Model): Model to render frames from
+        maxsize (int): Maximum number of frames to keep in memory
+        format (str): PIL image format frames are encoded with, or None
+    """
+    angles = range(-90, 91)
+
+    def __init__(self, model, eager=False, maxsize=181, format=None):
+        self.model = model
+        self.maxsize = maxsize
+        self.format = format
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+        if eager:
+            for angle in self.angles:
+                self.get(angle)
+
+    def get(self, angle):
+        """
+        Function to get the frame for a viewing angle, rendering it on first use
 
+        Args:
+            angle (int): Viewing angle in degrees, rounded to the nearest integer
 
+        Returns:
+            (PIL Image or bytes): image with arrow pasted for the viewing angle
+        """
+        angle = int(round(angle))
+        with self._lock:
+            if angle in self._frames:
+                self._frames.move_to_end(angle)
+                metrics.count('model_frames.hits')
+                return self._frames[angle]
+
+        metrics.count('model_frames.misses')
+        with metrics.timer('model.render'):
+            if self.format is None:
+                frame = self.model.render(angle)
+            else:
+                frame = self.model.encode(angle, format=self.format)
+        with self._lock:
+            frame = self._frames.setdefault(angle, frame)
+            self._frames.move_to_end(angle)
+            while len(self._frames) > max(self.maxsize, 0):
+                self._frames.popitem(last=False)
+        return frame
+
+    def __len__(self):
+        with self._lock:
+            return len(self._frames)
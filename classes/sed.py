@@ -0,0 +1,336 @@
+import argparse
+from concurrent.futures import Future, ThreadPoolExecutor
+import io
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from . import metrics
+from .budget import budget
+
+
+def default_dir():
+    """
+    Function to get the directory SEDs are cached in, overridable through AGNITE_CACHE_DIR
+
+    Returns:
+        (str): path of SED cache directory
+    """
+    root = os.environ.get('AGNITE_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'agnite'))
+    return os.path.join(root, 'sed')
+
+
+def ned_photometry(obj):
+    """
+    Function to query frequency and flux density of an object's photometry from NED
+
+    Args:
+        obj (str): General name of object
+
+    Returns:
+        freq (ndarray): frequency in Hz
+        den (ndarray): flux density in Jy
+    """
+    from astroquery.ipac.ned import Ned
+
+    table = Ned.get_table(obj, table='photometry')
+    freq = np.ma.filled(np.ma.asarray(table['Frequency'], dtype=float), np.nan)
+    den = np.ma.filled(np.ma.asarray(table['Flux Density'], dtype=float), np.nan)
+    return freq, den
+
+
+# Number of log-frequency bins per decade that photometry is aggregated into
+BINS_PER_DECADE = 4
+
+
+def reduce(freq, den, bins=BINS_PER_DECADE):
+    """
+    Function to aggregate photometry into log-frequency bins with their median and spread
+
+    Drops NaN and non-positive values, then sorts all measurements by bin and flux density
+    once, so every bin's percentiles are read off the sorted array at the same time.
+    Repeated measurements of the same band from different apertures or epochs end up in
+    one bin and are summarized instead of plotted on top of each other.
+
+    Args:
+        freq (ndarray): frequency in Hz
+        den (ndarray): flux density in Jy
+        bins (int): Number of bins per decade of frequency
+
+    Returns:
+        df (DataFrame): Pandas DataFrame of bin center Frequency, median Density, 16th and 84th
+        percentile Low and High, and number of measurements Count, one row per non-empty bin
+    """
+    import pandas as pd
+
+    freq = np.asarray(freq, dtype=float)
+    den = np.asarray(den, dtype=float)
+    good = np.isfinite(freq) & np.isfinite(den) & (freq > 0) & (den > 0)
+    logf = np.log10(freq[good])
+    logd = np.log10(den[good])
+
+    index = np.floor(logf * bins).astype(np.int64)
+    order = np.lexsort((logd, index))
+    index, logd = index[order], logd[order]
+    starts = np.flatnonzero(np.r_[True, index[1:] != index[:-1]]) if len(index) else np.zeros(0, dtype=int)
+    counts = np.diff(np.r_[starts, len(index)])
+
+    def percentile(q):
+        # Linear interpolation between the closest ranks of each bin, as np.percentile does
+        pos = starts + q * (counts - 1)
+        low = np.floor(pos).astype(int)
+        high = np.ceil(pos).astype(int)
+        return 10 ** (logd[low] + (pos - low) * (logd[high] - logd[low]))
+
+    return pd.DataFrame({'Frequency': 10 ** ((index[starts] + .5) / bins), 'Density': percentile(.5),
+                         'Low': percentile(.16), 'High': percentile(.84), 'Count': counts})
+
+
+class SEDCache:
+    """
+    The SEDCache class keeps NED photometry of each object on disk as an npz file
+
+    Fresh entries are served straight from disk. Entries older than ttl are still served,
+    and refreshed from the fetcher in the background (stale-while-revalidate). Objects that
+    have never been cached are fetched on a bounded thread pool, and concurrent requests
+    for the same object share a single in-flight fetch.
+
+    Args:
+        directory (str): Directory to store npz files in, defaults to default_dir()
+        ttl (float): Time in seconds before a cached SED is considered stale
+        fetcher (callable): Function taking an object name and returning frequency and density arrays
+        workers (int): Maximum number of fetches running at once
+
+    Attributes:
+        directory (str): Directory npz files are stored in
+        ttl (float): Time in seconds before a cached SED is considered stale
+        fetcher (callable): Function taking an object name and returning frequency and density arrays
+        workers (int): Maximum number of fetches running at once
+    """
+    def __init__(self, directory=None, ttl=30 * 24 * 3600, fetcher=ned_photometry, workers=4):
+        self.directory = directory or default_dir()
+        self.ttl = ttl
+        self.fetcher = fetcher
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._pool = None
+
+    def path(self, obj):
+        """
+        Method to get the cache file path for an object
+
+        Args:
+            obj (str): General name of object
+
+        Returns:
+            (str): path of npz file
+        """
+        name = re.sub(r'[^A-Za-z0-9.+-]+', '_', obj).strip('_')
+        return os.path.join(self.directory, name + '.npz')
+
+    def read(self, obj):
+        """
+        Method to read a cached SED from disk
+
+        Args:
+            obj (str): General name of object
+
+        Returns:
+            df (DataFrame): Pandas DataFrame of frequency and density, or None if not cached
+            fetched (float): Unix time the SED was fetched, or None if not cached
+        """
+        import pandas as pd
+
+        try:
+            with np.load(self.path(obj)) as data:
+                df = pd.DataFrame({'Frequency': data['freq'], 'Density': data['den']})
+                fetched = float(data['fetched'])
+        except (OSError, KeyError, ValueError):
+            return None, None
+        return df, fetched
+
+    def fetch(self, obj):
+        """
+        Method to fetch an SED with the fetcher and write it to disk
+
+        Args:
+            obj (str): General name of object
+
+        Returns:
+            df (DataFrame): Pandas DataFrame of frequency and density
+        """
+        import pandas as pd
+
+        with metrics.timer('sed_cache.fetch'):
+            freq, den = self.fetcher(obj)
+        freq = np.asarray(freq, dtype=float)
+        den = np.asarray(den, dtype=float)
+
+        os.makedirs(self.directory, exist_ok=True)
+        buf = io.BytesIO()
+        np.savez(buf, freq=freq, den=den, fetched=time.time())
+        # Write to a temporary file first so readers never see a partial file
+        path = self.path(obj)
+        tmp = '%s.%d.%d.tmp' % (path, os.getpid(), threading.get_ident())
+        with open(tmp, 'wb') as f:
+            f.write(buf.getvalue())
+        os.replace(tmp, path)
+
+        return pd.DataFrame({'Frequency': freq, 'Density': den})
+
+    def request(self, obj):
+        """
+        Method to ask for an object's SED without blocking
+
+        Args:
+            obj (str): General name of object
+
+        Returns:
+            (Future): future of the Pandas DataFrame of frequency and density, already
+            done when the SED is cached on disk
+        """
+        df, fetched = self.read(obj)
+        if df is None:
+            metrics.count('sed_cache.misses')
+            return self._submit(obj)
+        if time.time() - fetched > self.ttl:
+            metrics.count('sed_cache.stale_hits')
+            self.revalidate(obj)
+        else:
+            metrics.count('sed_cache.hits')
+        future = Future()
+        future.set_result(df)
+        return future
+
+    def get(self, obj, timeout=None):
+        """
+        Method to get an object's SED, fetching it only when it has never been cached
+
+        Args:
+            obj (str): General name of object
+            timeout (float): Seconds to wait for a fetch, or None to wait until it finishes
+
+        Returns:
+            df (DataFrame): Pandas DataFrame of frequency and density
+
+        Raises:
+            TimeoutError: if the SED is not cached and the fetch takes longer than timeout
+        """
+        return self.request(obj).result(timeout)
+
+    def reduced(self, obj, timeout=None, bins=BINS_PER_DECADE):
+        """
+        Method to get an object's SED aggregated into log-frequency bins, reduced once per fetch and
+        kept in the shared cache budget
+
+        Args:
+            obj (str): General name of object
+            timeout (float): Seconds to wait for a fetch, or None to wait until it finishes
+            bins (int): Number of bins per decade of frequency
+
+        Returns:
+            df (DataFrame): Pandas DataFrame of binned SED, as made by reduce
+
+        Raises:
+            TimeoutError: if the SED is not cached and the fetch takes longer than timeout
+        """
+        # Taken before reading, so a refresh landing in between is reduced again next time
+        try:
+            stamp = os.stat(self.path(obj)).st_mtime_ns
+        except OSError:
+            stamp = None
+        key = ('sed.reduced', self.directory, obj, bins)
+        hit = budget.get(key)
+        if hit is not None and stamp is not None and hit[0] == stamp:
+            metrics.count('sed_cache.reduced_hits')
+            return hit[1]
+
+        df = self.get(obj, timeout)
+        start = time.perf_counter()
+        with metrics.timer('sed_cache.reduce'):
+            reduced = reduce(df['Frequency'].to_numpy(), df['Density'].to_numpy(), bins)
+        # Charged with the reduction only, since the photometry itself stays on disk
+        budget.put(key, (stamp, reduced), time.perf_counter() - start)
+        return reduced
+
+    def revalidate(self, obj):
+        """
+        Method to refresh a cached SED in the background, keeping the stale copy on failure
+
+        Args:
+            obj (str): General name of object
+
+        Returns:
+            (Future): future of the refreshed Pandas DataFrame
+        """
+        return self._submit(obj)
+
+    def _submit(self, obj):
+        with self._lock:
+            future = self._inflight.get(obj)
+            if future is not None:
+                return future
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='sed-fetch')
+            future = self._pool.submit(self.fetch, obj)
+            self._inflight[obj] = future
+        # Outside the lock, since the callback runs right away if the fetch already finished
+        future.add_done_callback(lambda done: self._forget(obj, done))
+        return future
+
+    def _forget(self, obj, future):
+        with self._lock:
+            if self._inflight.get(obj) is future:
+                del self._inflight[obj]
+
+    def prefetch(self, objs, refresh=False):
+        """
+        Method to fill the cache for several objects
+
+        Args:
+            objs (iterable): General names of objects
+            refresh (bool): Fetch again even if a cached SED exists
+
+        Returns:
+            failed (dict): Object names that could not be fetched mapped to their error
+        """
+        failed = {}
+        for obj in objs:
+            if not refresh and self.read(obj)[0] is not None:
+                continue
+            try:
+                self.fetch(obj)
+            except Exception as e:
+                failed[obj] = e
+        return failed
+
+
+# Shared cache used by AGN.get_sed
+cache = SEDCache()
+
+
+def main(argv=None):
+    """
+    Command line entry point to prefetch SEDs of every classified AGN object into the cache,
+    run as python -m classes sed
+
+    Args:
+        argv (list): Command line arguments, defaults to sys.argv
+    """
+    from .catalog import CLASSIFICATIONS
+
+    parser = argparse.ArgumentParser(prog='python -m classes sed', description='Prefetch NED photometry for every AGN type')
+    parser.add_argument('--dir', default=None, help='cache directory (default: %s)' % default_dir())
+    parser.add_argument('--refresh', action='store_true', help='fetch again even if already cached')
+    args = parser.parse_args(argv)
+
+    sed_cache = SEDCache(directory=args.dir) if args.dir else cache
+    objs = [obj for _, obj in CLASSIFICATIONS.values()]
+    failed = sed_cache.prefetch(objs, refresh=args.refresh)
+    for obj in objs:
+        print('%-28s %s' % (obj, 'failed: %s' % failed[obj] if obj in failed else 'cached'))
+    return 1 if failed else 0
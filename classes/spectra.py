@@ -1,7 +1,14 @@
-from astropy.io import fits
-from astroquery.ipac.ned import Ned
+from functools import lru_cache
+from types import MappingProxyType
+
 import numpy as np
-import pandas as pd
+from . import catalog
+from . import fitsio
+from . import lines
+from . import metrics
+from . import sed
+from .budget import budget
+from .store import store
 
 
 def no_zero(wave, flux):
@@ -17,9 +24,127 @@ def no_zero(wave, flux):
        ndarray: flux density where resting wavelength is not 0
     """
     ind = wave > 0
+    # BASS spectra are padded with zeros at the end, so the kept part is usually one run
+    # that can be sliced as a view instead of copied out by the mask
+    if ind.any():
+        first = int(ind.argmax())
+        last = len(ind) - int(ind[::-1].argmax())
+        if ind[first:last].all():
+            return wave[first:last], flux[first:last]
     return wave[ind], flux[ind]
 
 
+# Ways a spectrum can be processed before plotting, each taking a width in Angstrom
+KERNELS = ('gaussian', 'boxcar', 'rebin')
+
+
+def rebin(wave, flux, factor):
+    """
+    Function that reduces the resolution of a spectrum by merging every factor neighbouring pixels,
+    conserving the integrated flux
+
+    Each pixel spans half way to its neighbours. Merged pixels get the flux density averaged
+    over their combined width, at the width-weighted mean wavelength.
+
+    Args:
+        wave (ndarray): rest wavelength, in increasing order
+        flux (ndarray): flux density
+        factor (int): Number of pixels to merge, the last merged pixel may hold fewer
+
+    Returns:
+       ndarray: rest wavelength of merged pixels
+       ndarray: flux density of merged pixels
+    """
+    wave = np.asarray(wave, dtype=np.float64)
+    flux = np.asarray(flux, dtype=np.float64)
+    if factor <= 1 or len(wave) < 2:
+        return wave, flux
+    mid = (wave[1:] + wave[:-1]) / 2
+    edges = np.concatenate(([2 * wave[0] - mid[0]], mid, [2 * wave[-1] - mid[-1]]))
+    widths = np.diff(edges)
+    starts = np.arange(0, len(wave), factor)
+    total = np.add.reduceat(widths, starts)
+    return np.add.reduceat(wave * widths, starts) / total, np.add.reduceat(flux * widths, starts) / total
+
+
+def convolve(flux, kernel):
+    """
+    Function that convolves a spectrum with a kernel through FFTs, reflecting the spectrum at
+    both ends so the edges are not pulled towards zero
+
+    Args:
+        flux (ndarray): flux density
+        kernel (ndarray): kernel of odd length, summing to 1 to conserve flux
+
+    Returns:
+       ndarray: convolved flux density, of the same length as flux
+    """
+    n, half = len(flux), len(kernel) // 2
+    if half == 0 or n < 2:
+        return np.asarray(flux, dtype=np.float64)
+    padded = np.pad(np.asarray(flux, dtype=np.float64), half, mode='reflect')
+    size = 1 << (len(padded) + len(kernel) - 2).bit_length()
+    out = np.fft.irfft(np.fft.rfft(padded, size) * np.fft.rfft(kernel, size), size)
+    return out[2 * half:2 * half + n]
+
+
+def smooth(wave, flux, kernel='gaussian', width=10):
+    """
+    Function that smooths or rebins a spectrum
+
+    Args:
+        wave (ndarray): rest wavelength, in increasing order
+        flux (ndarray): flux density
+        kernel (str): 'gaussian' to convolve with a Gaussian of FWHM width, 'boxcar' to average over
+            width, or 'rebin' to merge pixels into bins of about width
+        width (float): Width in Angstrom
+
+    Returns:
+       ndarray: rest wavelength
+       ndarray: processed flux density
+    """
+    if kernel not in KERNELS:
+        raise ValueError('Unknown kernel %r, use one of %s' % (kernel, ', '.join(KERNELS)))
+    if len(wave) < 2 or width <= 0:
+        return wave, flux
+    # BASS spectra are evenly sampled, so a width in Angstrom is a fixed number of pixels
+    step = float(np.median(np.diff(wave)))
+    if kernel == 'rebin':
+        return rebin(wave, flux, int(round(width / step)))
+    if kernel == 'gaussian':
+        sigma = width / (2 * np.sqrt(2 * np.log(2))) / step
+        x = np.arange(-int(np.ceil(4 * sigma)), int(np.ceil(4 * sigma)) + 1)
+        weights = np.exp(-.5 * (x / sigma) ** 2)
+    else:
+        weights = np.ones(2 * int(round(width / step / 2)) + 1)
+    return wave, convolve(flux, weights / weights.sum())
+
+
+@budget.memoize('spectra.smoothed')
+def smoothed(num, kernel, width, path='assets/BASS_fits.zip/BASS_DR1_'):
+    """
+    Function that gives a cached, smoothed or rebinned copy of a BASS spectrum
+
+    Args:
+        num (str): Swift BAT object ID number as a 4 digit string
+        kernel (str): 'gaussian', 'boxcar' or 'rebin', as taken by smooth
+        width (float): Width in Angstrom
+        path (str): Path prefix of fits files
+
+    Returns:
+       ndarray: read-only float32 rest wavelength
+       ndarray: read-only float32 processed flux density
+    """
+    spec = store.get(num, path)
+    with metrics.timer('spectra.smooth'):
+        wave, flux = smooth(spec.wave, spec.flux, kernel, width)
+    wave = np.array(wave, dtype=np.float32)
+    flux = np.array(flux, dtype=np.float32)
+    wave.setflags(write=False)
+    flux.setflags(write=False)
+    return wave, flux
+
+
 def open_spec(path, file):
     """
     Function to get rest wavelength and flux density out of FITS file
@@ -32,325 +157,303 @@ def open_spec(path, file):
         wave: rest wavelength
         flux: flux density
     """
-    data = fits.open(path + file)[1].data
+    _, data = fitsio.read_table(path + file)
     wavefull = data['Rest-wavelength']
     fluxfull = data['Flux density']
     wave, flux = no_zero(wavefull, fluxfull)
     return wave, flux
 
 
+def decimate(wave, flux, points):
+    """
+    Function that reduces a spectrum to about the given number of points with min/max bucketing,
+    keeping the peaks and troughs of emission and absorption features visible
+
+    Args:
+        wave (ndarray): rest wavelength
+        flux (ndarray): flux density
+        points (int): Target number of points, spectra with fewer points are returned unchanged
+
+    Returns:
+       ndarray: rest wavelength of kept points
+       ndarray: flux density of kept points
+    """
+    n = len(wave)
+    buckets = max(points // 2, 1)
+    if n <= points or n < 3:
+        return wave, flux
+
+    # Pad the spectrum with its last value so it splits into equal buckets, then keep
+    # the lowest and highest flux of each bucket in wavelength order
+    size = -(-n // buckets)
+    padded = np.empty(buckets * size, dtype=flux.dtype)
+    padded[:n] = flux
+    padded[n:] = flux[-1]
+    padded = padded.reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    ind = np.concatenate(([0], offsets + padded.argmin(axis=1), offsets + padded.argmax(axis=1), [n - 1]))
+    ind = np.unique(np.minimum(ind, n - 1))
+    return wave[ind], flux[ind]
+
+
+@budget.memoize('spectra.decimated')
+def decimated(num, points, path='assets/BASS_fits.zip/BASS_DR1_', kernel=None, width=0):
+    """
+    Function that gives a cached, decimated copy of a BASS spectrum for plotting
+
+    Args:
+        num (str): Swift BAT object ID number as a 4 digit string
+        points (int): Target number of points
+        path (str): Path prefix of fits files
+        kernel (str): 'gaussian', 'boxcar' or 'rebin' to process the spectrum first, or None
+        width (float): Width in Angstrom of processing, 0 for none
+
+    Returns:
+       ndarray: read-only rest wavelength of kept points
+       ndarray: read-only flux density of kept points
+    """
+    if kernel is not None and width > 0:
+        wave, flux = smoothed(num, kernel, width, path)
+    else:
+        wave, flux = store.get(num, path)
+    wave, flux = decimate(wave, flux, points)
+    wave.setflags(write=False)
+    flux.setflags(write=False)
+    return wave, flux
+
+
+def classify(angle, choice=0, path='assets/BASS_fits.zip/BASS_DR1_'):
+    """
+    Function that matches a viewing angle to an AGN type and the object used as its example
+
+    Args:
+        angle (int): Viewing angle in degrees
+        choice (int): Index of the candidate object of the type, 0 for its default object
+        path (str): Path prefix of fits files the catalog is made from
+
+    Returns:
+        type (str): Type of AGN
+        num (str): Swift BAT object ID number as a 4 digit string
+        obj (str): General name of object used as example for AGN type
+    """
+    agn_type, candidates = catalog.get_catalog(path).lookup(angle)
+    rec = candidates[min(max(choice, 0), len(candidates) - 1)]
+    return agn_type, rec['num'], rec['name']
+
+
+# Distance in Angstrom below which neighbouring line markers take turns putting their labels left and right
+LABEL_GAP = 60.0
+
+
+@lru_cache(maxsize=None)
+def line_overlay(num, path='assets/BASS_fits.zip/BASS_DR1_'):
+    """
+    Function that builds the dotted markers and labels of an object's emission lines in one batch
+
+    Lines come from the line index. Within each run of lines closer together than LABEL_GAP,
+    labels alternate between the left and right of their markers so they do not overlap.
+
+    Args:
+        num (str): Swift BAT object ID number as a 4 digit string
+        path (str): Path prefix of fits files
+
+    Returns:
+        shapes (tuple): Plotly layout shape dictionaries, one vertical line per emission line
+        annotations (tuple): Plotly layout annotation dictionaries, one label per emission line
+    """
+    found = list(lines.get_line_index(path).lines(num).values())
+    waves = np.array([wave for wave, _ in found])
+    new_run = np.diff(waves, prepend=-np.inf) >= LABEL_GAP
+    starts = np.flatnonzero(new_run)
+    right = (np.arange(len(waves)) - starts[np.cumsum(new_run) - 1]) % 2 == 1
+    shapes = []
+    annotations = []
+    for (wave, label), side in zip(found, right):
+        shapes.append(dict(type='line', x0=wave, x1=wave, xref='x', y0=0, y1=1, yref='y domain',
+                           line=dict(color='grey', width=1, dash='dot')))
+        # A label on the left of the marker is anchored by its right edge, and vice versa
+        annotations.append(dict(x=wave, y=1, xref='x', yref='y domain', text=label, showarrow=False,
+                                textangle=-90, xanchor='left' if side else 'right', yanchor='top'))
+    return tuple(shapes), tuple(annotations)
+
+
+@budget.memoize('spectra.lines')
+def line_table(num, path='assets/BASS_fits.zip/BASS_DR1_'):
+    """
+    Function that gives the cached flux, equivalent width and FWHM of every emission line detected in a BASS spectrum
+
+    Args:
+        num (str): Swift BAT object ID number as a 4 digit string
+        path (str): Path prefix of fits files
+
+    Returns:
+        df (DataFrame): Pandas DataFrame of Line label, rest Wavelength in Angstrom, line Flux in erg/cm^2/s,
+        equivalent width EW in Angstrom and FWHM in km/s, one row per line in order of wavelength
+    """
+    import pandas as pd
+
+    wave, flux = store.get(num, path)
+    found = list(lines.get_line_index(path).lines(num).values())
+    centers = np.array([center for center, _ in found])
+    # Every known line is kept out of the continuum, detected or not, so faint neighbours do not raise it
+    mask = np.array([center for center, _ in lines.MASTER.values()])
+    with metrics.timer('lines.measure'):
+        measured = lines.measure(wave, flux, centers, mask)
+    return pd.DataFrame({'Line': [label for _, label in found], 'Wavelength': centers, 'Flux': measured['flux'],
+                         'EW': measured['ew'], 'FWHM': measured['fwhm']})
+
+
 class AGN:
     """
         The AGN class stores data related to AGN data for chosen viewing angle
 
         Args:
             angle (int): Viewing angle in degrees
+            path (str): Path to fits files
+            choice (int): Index of the candidate object shown for the type of angle, 0 for the default
 
         Attributes:
             angle (int): Viewing angle in degrees
             path (str): Path to fits files
+            choice (int): Index of the candidate object shown for the current type
             type (str): Type of AGN
             num (str): Swift BAT object ID number as a 4 digit string
             obj (str): General name of object used as example for AGN type
-            wave (ndarray): Wavelength values in Angstrom
-            flux (ndarray): Flux values in erg/cm^2/s/A
-            df (DataFrame): Wavelength and Flux in a Pandas DataFrame
+            spectrum (Spectrum): Cleaned spectrum shared with the spectrum store
+            wave (ndarray): Read-only float32 wavelength values in Angstrom
+            flux (ndarray): Read-only float32 flux values in erg/cm^2/s/A
+            df (DataFrame): Wavelength and Flux in a Pandas DataFrame, made when accessed
             lines (dict): Dictionary of emission lines for object
         """
-    def __init__(self, angle, path='assets/BASS_fits.zip/BASS_DR1_'):
+    def __init__(self, angle, path='assets/BASS_fits.zip/BASS_DR1_', choice=0):
 
-        self.angle = angle
         self.path = path
+        self.choice = choice
+        self.rotate(angle)
 
-        if (angle >= 75) & (angle <= 90):
-            self.type = 'Blazar'
-            self.num = '0619'
-            self.obj = '3C 273'
-        elif (angle >= 45) & (angle < 75):
-            self.type = 'Radio-Loud Quasar'
-            self.num = '0715'
-            self.obj = '2MASX J14174289+6141523'
-        elif (angle >= 20) & (angle < 45):
-            self.type = 'Broad Line Radio Galaxy'
-            self.num = '1110'
-            self.obj = '4C 50.55'
-        elif (angle >= 0) & (angle < 20):
-            self.type = 'Narrow Line Radio Galaxy'
-            # Maybe also 474? But that's a Seyfert 1 which doesn't make sense?
-            # Also 360
-            self.num = '0474'
-            self.obj = 'VII Zw 292'
-        elif (angle >= -45) & (angle < 0):
-            self.type = 'Seyfert 2'
-            # Also 10, 49,
-            self.num = '0007'
-            self.obj = '2MASX J00091156-0036551'
-        elif (angle >= -70) & (angle < -45):
-            self.type = 'Seyfert 1'
-            #self.num = '0002'
-            self.num = '0126'
-            #self.obj = 'Fairall 1203'
-            self.obj = 'Fairall 296'
-        elif (angle >= -90) & (angle < -70):
-            self.type = 'Radio-Quiet Quasar'
-            #num = '1146'
-            self.num = '0016'
-            #obj = 'Mrk 304'
-            self.obj = '[HB89] 0026+129'
-
-        data = fits.open(self.path + self.num + '.fits')[1].data
-        wave_full = data['Rest-wavelength']
-        flux_full = data['Flux density']
-        self.wave, self.flux = no_zero(wave_full, flux_full)
-        self.df = pd.DataFrame({"Wavelength": self.wave, "Flux": self.flux})
-        self.get_lines()
-
-    def rotate(self, angle):
+    @metrics.timed('agn.rotate')
+    def rotate(self, angle, choice=None):
         """
         Method to refresh attributes for new viewing angle
 
         Args:
             angle (int): Viewing angle in degrees
+            choice (int): Index of the candidate object shown for the type of angle, or None to keep the
+                current one within the same type and show the default object of any other type
         """
+        if choice is None and getattr(self, 'type', None) is not None \
+                and catalog.get_catalog(self.path).lookup(angle)[0] != self.type:
+            choice = 0
         self.angle = angle
+        if choice is not None:
+            self.choice = choice
+        self.type, self.num, self.obj = classify(angle, self.choice, self.path)
 
-        if (angle >= 75) & (angle <= 90):
-            self.type = 'Blazar'
-            self.num = '0619'
-            self.obj = '3C 273'
-        elif (angle >= 45) & (angle < 75):
-            self.type = 'Radio-Loud Quasar'
-            self.num = '0715'
-            self.obj = '2MASX J14174289+6141523'
-        elif (angle >= 20) & (angle < 45):
-            self.type = 'Broad Line Radio Galaxy'
-            self.num = '1110'
-            self.obj = '4C 50.55'
-        elif (angle >= 0) & (angle < 20):
-            self.type = 'Narrow Line Radio Galaxy'
-            # Maybe also 474? But that's a Seyfert 1 which doesn't make sense?
-            # Also 360
-            self.num = '0474'
-            self.obj = 'VII Zw 292'
-        elif (angle >= -45) & (angle < 0):
-            self.type = 'Seyfert 2'
-            # Also 10, 49,
-            self.num = '0007'
-            self.obj = '2MASX J00091156-0036551'
-        elif (angle >= -70) & (angle < -45):
-            self.type = 'Seyfert 1'
-            self.type = 'Seyfert 1'
-            # self.num = '0002'
-            self.num = '0126'
-            # self.obj = 'Fairall 1203'
-            self.obj = 'Fairall 296'
-        elif (angle >= -90) & (angle < -70):
-            self.type = 'Radio-Quiet Quasar'
-            # num = '1146'
-            self.num = '0016'
-            # obj = 'Mrk 304'
-            self.obj = '[HB89] 0026+129'
-
-        data = fits.open(self.path + self.num + '.fits')[1].data
-        wave_full = data['Rest-wavelength']
-        flux_full = data['Flux density']
-        self.wave, self.flux = no_zero(wave_full, flux_full)
-        self.df = pd.DataFrame({"Wavelength": self.wave, "Flux": self.flux})
+        self.spectrum = store.get(self.num, self.path)
+        self.wave, self.flux = self.spectrum
         self.get_lines()
+        # Objects a user is likely to move to next are read before they are asked for, the neighbouring types' defaults
+        store.prefetch(catalog.get_catalog(self.path).neighbours(angle), self.path)
+
+    @property
+    def df(self):
+        return self.spectrum.df
 
-    def get_spec(self):
+    def get_spec(self, points=None, kernel=None, width=0):
         """
         Method to get rest wavelength and flux density out of FITS file
 
+        Args:
+            points (int): Target number of points to decimate to for plotting, or None for the full spectrum
+            kernel (str): 'gaussian', 'boxcar' or 'rebin' to smooth or rebin the spectrum, or None
+            width (float): Width in Angstrom of smoothing or bins, 0 for none
+
         Returns:
             wave (ndarray): rest wavelength
             flux (ndarray): flux density
         """
-        return self.wave, self.flux
-
-    def get_sed(self):
+        if points is None:
+            if kernel is not None and width > 0:
+                return smoothed(self.num, kernel, width, self.path)
+            return self.wave, self.flux
+        return decimated(self.num, points, self.path, kernel, width)
+
+    @metrics.timed('agn.get_sed')
+    def get_sed(self, timeout=None, reduced=True):
         """
-        Method to query frequency and density from NED and return dataframe for plotting SED
+        Method to get frequency and density from NED and return dataframe for plotting SED
+
+        Photometry is served from the on-disk SED cache and only queried from NED
+        when the object has never been cached
+
+        Args:
+            timeout (float): Seconds to wait for NED, or None to wait until it answers
+            reduced (bool): Aggregate the photometry into log-frequency bins with median and spread
 
         Returns:
-            df (DataFrame): Pandas DataFrame containing object's frequency and density values
+            df (DataFrame): Pandas DataFrame containing object's frequency and density values,
+            and Low, High and Count of each bin when reduced
+
+        Raises:
+            TimeoutError: if NED takes longer than timeout
         """
-        agn = Ned.get_table(self.obj, table='photometry')
-        freq = agn['Frequency']
-        den = agn['Flux Density']
-        df = pd.DataFrame({'Frequency': freq, 'Density': den})
-        return df
+        if reduced:
+            return sed.cache.reduced(self.obj, timeout)
+        return sed.cache.get(self.obj, timeout)
 
     def get_lines(self):
         """
-        Method to obtain emission lines for object based on type and set attribute self.lines
+        Method to look up the emission lines detected in the object and set attribute self.lines
         """
+        self.lines = lines.get_line_index(self.path).lines(self.num)
 
-        if self.type == "Blazar":
-            lines = {
-                "O3b": (5006.843, r"[OIIIb]"),
-                "H-beta": (4861.333, r"Hβ"),
-                "H-gamma": (4341.69, r"Hγ"),
-                "Fe5": (4180.600, r"[FeV]"),
-            }
-
-        elif self.type == "Radio-Loud Quasar":
-            lines = {
-                "H-alpha": (6562.819, r"Hα"),
-                "N2": (6585.23, r"[NII]"),
-                "O3a": (4958.911, r"[OIIIa]"),
-                "O3b": (5006.843, r"[OIIIb]"),
-                "H-beta": (4861.333, r"Hβ"),
-                "O2a": (3728.38, r"[OIIa]"),
-                "Ne3": (3868.760, r"[NeIIIa]"),
-                "S2a": (6716.440, r"[SIIa]"),
-                "S2b": (6730.810, r"[SIIb]")
-            }
-
-        elif self.type == "Broad Line Radio Galaxy":
-            lines = {
-                "H-alpha": (6562.819, r"Hα"),
-                "He1": (5877.25, r"He I"),
-                "H-beta": (4861.333, r"Hβ"),
-                "O3a": (4958.911, r"[OIIIa]"),
-                "O3b": (5006.843, r"[OIIIb]"),
-                "H1": (7065.196, r"H I")
-            }
-
-        elif self.type == "Narrow Line Radio Galaxy":
-            lines = {
-                "H-beta": (4861.333, r"Hβ"),
-                "O3a": (4958.911, r"[OIIIa]"),
-                "O3b": (5006.843, r"[OIIIb]"),
-                "H-alpha": (6562.819, r"Hα"),
-                "N2": (6585.23, r"[NII]"),
-                "S2": (6718.32, r"[SII]"),
-                "O1": (6300.304, r"[OI]")
-            }
-
-        elif self.type == "Seyfert 2":
-            lines = {
-                "O2b": (3729.86, r"[OIIb]"),
-                "Ne3": (3868.760, r"[NeIIIa]"),
-                "H-beta": (4861.333, r"Hβ"),
-                "O3a": (4958.911, r"[OIIIa]"),
-                "O3b": (5006.843, r"[OIIIb]"),
-                "N1": (5200.257, r"[NI]"),
-                "S2": (6718.32, r"[SII]"),
-                "O1_1": (6363.776, r"[OI]"),
-                "Fe7": (6087.000, r"[FeVII]"),
-                "H-gamma": (4340.471, r"Hγ"),
-                "Cl3a": (5517.709, r"ClIIIa"),
-                "Cl3b": (5537.873, r"ClIIIb"),
-                "Ar3": (7135.790, r"[ArIII]"),
-                "O2": (7330.730, r"[OII]"),
-                "O1_2": (6300.304, r"[OI]"),
-                "H-alpha": (6562.819, r"Hα"),
-                "N2": (6585.23, r"[NII]")
-                # "Fe10": (6374.510, r"[FeX")
-            }
-
-        elif self.type == "Seyfert 1":
-            lines = {
-                "Ne3": (3869.86, r"[NeIII]"),
-                "He2": (4685.710, r"[HeII]"),
-                "H-beta": (4861.333, r"Hβ"),
-                "O3a": (4958.911, r"[OIIIa]"),
-                "O3b": (5006.843, r"[OIIIb]"),
-                "Fe2": (5276.002, r"[FeII]"),
-                "He1": (5877.25, r"He I"),
-                #"N2": (6548.050, "[NII]"),
-                "H-alpha": (6562.819, r"Hα"),
-                "N2": (6585.23, r"[NII]"),
-                "Fe10": (6374.510, r"[FeX"),
-                #"O1": (6363.776, r"[OI]"),
-                #"S2": (6718.32, r"[SII]"),
-                "O1": (6300.304, r"[OI]"),
-                "H-gamma": (4340.471, r"Hγ"),
-                "O3": (4363.210, r"[OIII]"),
-                "H-delta": (4101.742, r"Hδ"),
-                "H-epsilon": (3970.079, r"Hε")
-            }
-
-        elif self.type == "Radio-Quiet Quasar":
-            lines = {
-                "He2": (4685.710, r"[HeII]"),
-                "H-beta": (4861.333, r"Hβ"),
-                "O3a": (4958.911, r"[OIIIa]"),
-                "O3b": (5006.843, r"[OIIIb]"),
-                "H-gamma": (4341.69, r"Hγ"),
-                "O3": (4363.210, r"[OIII]"),
-                "Fe2": (5169.033, r"Fe II")
-
-            }
-
-        self.lines = lines
+    def measure_lines(self):
+        """
+        Method to measure the emission lines detected in the object's spectrum
+
+        Returns:
+            df (DataFrame): Pandas DataFrame of each line's label, rest wavelength, flux, equivalent width and FWHM
+        """
+        return line_table(self.num, self.path)
 
     def plot_lines(self, fig):
         """
         Method to plot emission lines over spectrum in plotly
 
+        All markers are added in a single layout update from the cached overlay of the type,
+        instead of one validated add_vline call per line
+
         Args:
             fig (Figure): Plotly Figure to overplot lines onto
         """
+        shapes, annotations = line_overlay(self.num, self.path)
+        fig.update_layout(shapes=fig.layout.shapes + shapes, annotations=fig.layout.annotations + annotations)
+
+
+class AGNView(AGN):
+    """
+        The AGNView class is a read-only AGN for a single type that can be shared between
+        sessions and threads, since nothing about it changes after construction
 
-        lines = self.lines
-
-        if self.type == "Blazar":
-            for key in lines:
-                fig.add_vline(lines[key][0], annotation_text=lines[key][1], line_color='grey', line_width=1,
-                              line_dash='dot', annotation_textangle=-90, annotation_position="top left")
-
-        if self.type == "Radio-Loud Quasar":
-            for key in lines:
-                if key == "O3b" or key == "S2b":
-                    fig.add_vline(lines[key][0], annotation_text=lines[key][1], line_color='grey', line_width=1,
-                                  line_dash='dot', annotation_textangle=-90, annotation_position="top right")
-                else:
-                    fig.add_vline(lines[key][0], annotation_text=lines[key][1], line_color='grey', line_width=1,
-                              line_dash='dot', annotation_textangle=-90, annotation_position="top left")
-
-        if self.type == "Broad Line Radio Galaxy":
-            for key in lines:
-                if key == "O3b":
-                    fig.add_vline(lines[key][0], annotation_text=lines[key][1], line_color='grey', line_width=1,
-                                  line_dash='dot', annotation_textangle=-90, annotation_position="top right")
-                else:
-                    fig.add_vline(lines[key][0], annotation_text=lines[key][1], line_color='grey', line_width=1,
-                              line_dash='dot', annotation_textangle=-90, annotation_position="top left")
-
-        if self.type == "Narrow Line Radio Galaxy":
-            for key in lines:
-                if (key == "O3b") or (key == "H-alpha") or (key == "S2"):
-                    fig.add_vline(lines[key][0], annotation_text=lines[key][1], line_color='grey', line_width=1,
-                                  line_dash='dot', annotation_textangle=-90, annotation_position="top right")
-                else:
-                    fig.add_vline(lines[key][0], annotation_text=lines[key][1], line_color='grey', line_width=1,
-                              line_dash='dot', annotation_textangle=-90, annotation_position="top left")
-
-        if self.type == "Seyfert 2":
-            for key in lines:
-                if (key == "O3b") or (key == "Cl3b") or (key == "N2") or (key == "S2"):
-                    fig.add_vline(lines[key][0], annotation_text=lines[key][1], line_color='grey', line_width=1,
-                                  line_dash='dot', annotation_textangle=-90, annotation_position="top right")
-                else:
-                    fig.add_vline(lines[key][0], annotation_text=lines[key][1], line_color='grey', line_width=1,
-                              line_dash='dot', annotation_textangle=-90, annotation_position="top left")
-
-        if self.type == "Seyfert 1":
-            for key in lines:
-                if (key == "O3b") or (key == "N2") or (key == "O3"):
-                    fig.add_vline(lines[key][0], annotation_text=lines[key][1], line_color='grey', line_width=1,
-                                  line_dash='dot', annotation_textangle=-90, annotation_position="top right")
-                else:
-                    fig.add_vline(lines[key][0], annotation_text=lines[key][1], line_color='grey', line_width=1,
-                              line_dash='dot', annotation_textangle=-90, annotation_position="top left")
-
-        if self.type == "Radio-Quiet Quasar":
-            for key in lines:
-                if key == "O3":
-                    fig.add_vline(lines[key][0], annotation_text=lines[key][1], line_color='grey', line_width=1,
-                                  line_dash='dot', annotation_textangle=-90, annotation_position="top right")
-                else:
-                    fig.add_vline(lines[key][0], annotation_text=lines[key][1], line_color='grey', line_width=1,
-                              line_dash='dot', annotation_textangle=-90, annotation_position="top left")
\ No newline at end of file
+        Args:
+            num (str): Swift BAT object ID number as a 4 digit string
+            path (str): Path to fits files
+
+        Attributes:
+            Same as AGN, with lines as a read-only mapping
+        """
+    def __init__(self, num, path='assets/BASS_fits.zip/BASS_DR1_'):
+        cat = catalog.get_catalog(path)
+        rec = cat.get(num)
+        if rec is None or rec['type'] is None:
+            raise ValueError('No AGN type uses object %r' % (num,))
+        candidates = cat.candidates[rec['type']]
+        choice = next(i for i, cand in enumerate(candidates) if cand['num'] == num)
+        super().__init__(cat.angle_range(rec['type'])[0], path, choice)
+        self.lines = MappingProxyType(self.lines)
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False):
+            raise AttributeError('AGNView is read-only, create an AGNView for the other object instead')
+        super().__setattr__(name, value)
@@ -0,0 +1,236 @@
+from collections import OrderedDict
+import threading
+
+import numpy as np
+
+from . import fitsio
+from . import metrics
+from .budget import budget
+from .ingest import COLUMNS, open_columns
+
+
+class Spectrum:
+    """
+    Cleaned spectrum of a single BASS object
+
+    Holds nothing but two read-only, contiguous float32 arrays, which are zero-copy views
+    when the spectrum comes from the columnar store. Plotting works from the arrays directly.
+
+    Args:
+        wave (ndarray): Rest wavelength in Angstrom without zero padding
+        flux (ndarray): Flux density in erg/cm^2/s/A where wavelength is not 0
+
+    Attributes:
+        wave (ndarray): Read-only rest wavelength in Angstrom without zero padding
+        flux (ndarray): Read-only flux density in erg/cm^2/s/A where wavelength is not 0
+    """
+    __slots__ = ('wave', 'flux')
+
+    def __init__(self, wave, flux):
+        self.wave = wave
+        self.flux = flux
+
+    @property
+    def df(self):
+        """
+        Wavelength and Flux in a new Pandas DataFrame, made on every access rather than kept
+        """
+        import pandas as pd
+
+        return pd.DataFrame({"Wavelength": self.wave, "Flux": self.flux})
+
+    @property
+    def nbytes(self):
+        """
+        Number of bytes held by the arrays
+        """
+        return self.wave.nbytes + self.flux.nbytes
+
+    def __iter__(self):
+        return iter((self.wave, self.flux))
+
+    def __len__(self):
+        return len(self.wave)
+
+    def __repr__(self):
+        return '<Spectrum of %d points from %.1f to %.1f A>' % (len(self), self.wave[0], self.wave[-1]) \
+            if len(self) else '<Spectrum of 0 points>'
+
+
+def load_spectrum(path, num, columns=None):
+    """
+    Function to read and clean a BASS spectrum, from a columnar store if it holds the object
+    and from its FITS file otherwise
+
+    The FITS file is memory mapped with the package's own binary table reader, and only the
+    non-zero part of the two needed columns is copied out of it as native float32.
+
+    Args:
+        path (str): Path prefix of fits files
+        num (str): Swift BAT object ID number as a 4 digit string
+        columns (Columns): Columnar store made by ingest, or None
+
+    Returns:
+        (Spectrum): cleaned, read-only spectrum
+    """
+    from .spectra import no_zero
+
+    if columns is not None and columns.path == path and num in columns:
+        # Already cleaned when ingested, and zero-copy views of the memory map
+        return Spectrum(*columns.get(num))
+
+    _, data = fitsio.read_table(path + num + '.fits')
+    wave, flux = no_zero(data['Rest-wavelength'], data['Flux density'])
+    # Copy once into contiguous native float32, so no view keeps the whole record array mapped
+    wave = np.array(wave, dtype=np.float32)
+    flux = np.array(flux, dtype=np.float32)
+    del data
+
+    wave.setflags(write=False)
+    flux.setflags(write=False)
+    return Spectrum(wave, flux)
+
+
+class SpectrumStore:
+    """
+    The SpectrumStore class is a process-wide, thread-safe cache of cleaned BASS spectra
+
+    Each FITS file is opened once and its cleaned arrays are shared by every AGN object
+    and session. Objects in the columnar store made by ingest are read from it instead of
+    their FITS files. Least recently used entries are evicted once more than maxsize
+    spectra are held.
+
+    Args:
+        maxsize (int): Maximum number of spectra to keep in memory
+        columns (str): Path prefix of the columnar store, or None to always read FITS files
+
+    Attributes:
+        maxsize (int): Maximum number of spectra to keep in memory
+        columns (str): Path prefix of the columnar store, or None
+        hits (int): Number of lookups served from memory
+        misses (int): Number of lookups that had to read a FITS file
+    """
+    def __init__(self, maxsize=16, columns=COLUMNS):
+        self.maxsize = maxsize
+        self.columns = columns
+        self._columns = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+
+    def get(self, num, path='assets/BASS_fits.zip/BASS_DR1_'):
+        """
+        Method to look up a spectrum by BASS ID, reading it from disk on first use
+
+        Args:
+            num (str): Swift BAT object ID number as a 4 digit string
+            path (str): Path prefix of fits files
+
+        Returns:
+            (Spectrum): cleaned, read-only spectrum
+        """
+        key = (path, num)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.count('spectrum_store.hits')
+                return self._entries[key]
+            self.misses += 1
+            metrics.count('spectrum_store.misses')
+            # One lock per key so concurrent sessions asking for the same file read it only once
+            loading = self._loading.setdefault(key, threading.Lock())
+
+        with loading:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    return self._entries[key]
+            try:
+                with metrics.timer('spectrum_store.load'):
+                    spec = load_spectrum(path, num, self._open_columns())
+                with self._lock:
+                    self._entries[key] = spec
+                    self._evict()
+            finally:
+                # Also dropped when the file is missing or corrupt, so later gets and prefetches try again
+                with self._lock:
+                    self._loading.pop(key, None)
+        return spec
+
+    def prefetch(self, nums, path='assets/BASS_fits.zip/BASS_DR1_'):
+        """
+        Method to load spectra that are likely to be needed soon in a background thread
+
+        Args:
+            nums (iterable): Swift BAT object ID numbers as 4 digit strings
+            path (str): Path prefix of fits files
+        """
+        with self._lock:
+            missing = [num for num in dict.fromkeys(nums)
+                       if (path, num) not in self._entries and (path, num) not in self._loading]
+        if not missing:
+            return
+
+        def load():
+            for num in missing:
+                try:
+                    self.get(num, path)
+                except Exception:
+                    pass
+
+        threading.Thread(target=load, daemon=True).start()
+
+    def resize(self, maxsize):
+        """
+        Method to change the maximum number of cached spectra, evicting if necessary
+
+        Args:
+            maxsize (int): Maximum number of spectra to keep in memory
+        """
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def clear(self):
+        """
+        Method to drop all cached spectra and reset hit and miss counters
+        """
+        with self._lock:
+            self._entries.clear()
+            self._columns = None
+            self.hits = 0
+            self.misses = 0
+
+    @property
+    def nbytes(self):
+        """
+        Number of bytes held by the cached spectra
+        """
+        with self._lock:
+            return sum(spec.nbytes for spec in self._entries.values())
+
+    def __contains__(self, num):
+        with self._lock:
+            return any(key[1] == num for key in self._entries)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _open_columns(self):
+        # Opened on first load rather than at import, so a store ingested later is still picked up
+        if self._columns is None and self.columns is not None:
+            self._columns = open_columns(self.columns)
+        return self._columns
+
+    def _evict(self):
+        while len(self._entries) > max(self.maxsize, 0):
+            self._entries.popitem(last=False)
+
+
+# Shared store used by every AGN object in the process, counted against the shared cache budget
+store = SpectrumStore()
+budget.track('spectrum_store', lambda: store.nbytes)
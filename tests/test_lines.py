@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from classes import lines
+from classes.spectra import line_overlay, line_table
+
+
+KEYS = sorted(lines.MASTER, key=lambda key: lines.MASTER[key][0])
+CENTERS = np.array([lines.MASTER[key][0] for key in KEYS])
+
+
+def spectrum(center, fwhm_kms, amplitude=1.0, noise=0.02, low=6200.0, high=6900.0, seed=0):
+    """
+    Function that makes a flat continuum of 1 per Angstrom with one Gaussian line and Gaussian noise
+
+    Args:
+        center (float): Rest wavelength of the line in Angstrom
+        fwhm_kms (float): FWHM of the line in km/s
+        amplitude (float): Peak height of the line above the continuum
+        noise (float): Standard deviation of the noise
+        low (float): First wavelength in Angstrom
+        high (float): Last wavelength in Angstrom
+        seed (int): Seed of the noise
+
+    Returns:
+        wave (ndarray): rest wavelength, sampled every Angstrom
+        flux (ndarray): flux density
+    """
+    wave = np.arange(low, high, 1.0)
+    sigma = center * fwhm_kms / lines.C_KMS / 2.3548
+    flux = 1 + amplitude * np.exp(-0.5 * ((wave - center) / sigma) ** 2)
+    return wave, flux + np.random.default_rng(seed).normal(0, noise, len(wave))
+
+
+def identified(wave, flux):
+    peaks, significance = lines.detect(wave, flux)
+    found = lines.match(peaks, significance, CENTERS)
+    return peaks, [KEYS[i] for i in np.flatnonzero(found >= 0)]
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_narrow_line_gives_one_matched_peak(seed):
+    wave, flux = spectrum(lines.MASTER['H-beta'][0], 400, low=4500, high=5300, seed=seed)
+    peaks, keys = identified(wave, flux)
+    assert len(peaks) == 1
+    assert keys == ['H-beta']
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_broad_line_gives_no_narrow_neighbours(seed):
+    wave, flux = spectrum(lines.MASTER['H-alpha'][0], 5000, noise=0.01, seed=seed)
+    _, keys = identified(wave, flux)
+    assert keys == ['H-alpha']
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_noise_gives_no_peaks(seed):
+    wave, flux = spectrum(lines.MASTER['H-alpha'][0], 400, amplitude=0, seed=seed)
+    peaks, significance = lines.detect(wave, flux)
+    assert len(peaks) == len(significance) == 0
+
+
+def test_unresolved_peaks_match_one_line():
+    # Two features of one bump between [OIb] and [FeX], the stronger nearer [OIb]
+    found = lines.match(np.array([6367.5, 6370.7]), np.array([12.0, 11.0]), CENTERS)
+    assert [KEYS[i] for i in np.flatnonzero(found >= 0)] == ['O1b']
+
+
+def test_line_index_round_trip(tmp_path):
+    index = str(tmp_path / 'lines.json')
+    objects = {'0001': [{'key': 'H-alpha', 'peak': 6563.1, 'snr': 40.0}], '0002': []}
+    lines.LineIndex(objects, 'fits/BASS_DR1_').save(index)
+
+    loaded = lines.LineIndex.load(index)
+    assert loaded.path == 'fits/BASS_DR1_'
+    assert loaded.lines('0001') == {'H-alpha': lines.MASTER['H-alpha']}
+    assert loaded.lines('0002') == {}
+    assert loaded.lines('9999') == {}
+
+
+def test_line_index_of_other_master_is_not_loaded(tmp_path, monkeypatch):
+    index = str(tmp_path / 'lines.json')
+    lines.LineIndex({}).save(index)
+    monkeypatch.setitem(lines.MASTER, 'H-alpha', (6563.0, 'Hα'))
+    assert lines.LineIndex.load(index) is None
+
+
+def test_catalog_features_are_resolved():
+    line_index = lines.get_line_index()
+    for num, found in line_index.objects.items():
+        peaks = np.array([line['peak'] for line in found])
+        assert np.all(lines.C_KMS * np.diff(peaks) / peaks[1:] > lines.RESOLUTION_KMS), num
+
+
+def test_object_without_lines_has_empty_overlay_and_table():
+    assert lines.get_line_index().lines('0545') == {}
+    assert line_overlay('0545') == ((), ())
+    assert line_table('0545').empty
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from classes import lines
+
+
+def spectrum(centers, fwhm_kms, amplitudes, noise=0.01, low=6200.0, high=6900.0, seed=0):
+    """
+    Function that makes a flat continuum of 1 per Angstrom with Gaussian lines and Gaussian noise
+
+    Args:
+        centers (list): Rest wavelength of each line in Angstrom
+        fwhm_kms (float): FWHM of every line in km/s
+        amplitudes (list): Peak height of each line above the continuum
+        noise (float): Standard deviation of the noise
+        low (float): First wavelength in Angstrom
+        high (float): Last wavelength in Angstrom
+        seed (int): Seed of the noise
+
+    Returns:
+        wave (ndarray): rest wavelength, sampled every Angstrom
+        flux (ndarray): flux density
+        fluxes (ndarray): line flux of each line
+    """
+    wave = np.arange(low, high, 1.0)
+    flux = np.ones(len(wave))
+    fluxes = []
+    for center, amplitude in zip(centers, amplitudes):
+        sigma = center * fwhm_kms / lines.C_KMS / 2.3548
+        flux += amplitude * np.exp(-0.5 * ((wave - center) / sigma) ** 2)
+        fluxes.append(amplitude * sigma * np.sqrt(2 * np.pi))
+    return wave, flux + np.random.default_rng(seed).normal(0, noise, len(wave)), np.array(fluxes)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_isolated_line(seed):
+    center = lines.MASTER['H-alpha'][0]
+    wave, flux, fluxes = spectrum([center], 500, [2.0], seed=seed)
+    measured = lines.measure(wave, flux, [center])
+    assert measured['flux'][0] == pytest.approx(fluxes[0], rel=0.05)
+    assert measured['ew'][0] == pytest.approx(fluxes[0], rel=0.05)
+    assert measured['fwhm'][0] == pytest.approx(500, rel=0.1)
+    assert measured['continuum'][0] == pytest.approx(1, rel=0.01)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_close_doublet_is_split(seed):
+    # [SII] 6716/6731, about 640 km/s apart, with lines wide enough to blend into each other
+    centers = [lines.MASTER['S2a'][0], lines.MASTER['S2b'][0]]
+    wave, flux, fluxes = spectrum(centers, 400, [3.0, 1.0], seed=seed)
+    measured = lines.measure(wave, flux, centers)
+    assert measured['flux'] == pytest.approx(fluxes, rel=0.1)
+    assert measured['flux'][1] / measured['flux'][0] == pytest.approx(1 / 3, rel=0.1)
+    assert measured['fwhm'] == pytest.approx([400, 400], rel=0.15)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_faint_neighbour_is_kept_out_of_continuum(seed):
+    # [OIII] 4959/5007 at 1:3, the fainter not swallowed by the brighter one
+    centers = [lines.MASTER['O3a'][0], lines.MASTER['O3b'][0]]
+    wave, flux, fluxes = spectrum(centers, 500, [1.0, 3.0], low=4500, high=5300, seed=seed)
+    measured = lines.measure(wave, flux, centers)
+    assert measured['flux'] == pytest.approx(fluxes, rel=0.1)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_broad_line_is_not_cut_off(seed):
+    center = lines.MASTER['H-alpha'][0]
+    wave, flux, fluxes = spectrum([center], 5000, [1.0], low=6000, high=7200, seed=seed)
+    measured = lines.measure(wave, flux, [center])
+    assert measured['flux'][0] == pytest.approx(fluxes[0], rel=0.1)
+    assert measured['fwhm'][0] == pytest.approx(5000, rel=0.1)
+
+
+def test_absorption_is_refused():
+    center = lines.MASTER['H-alpha'][0]
+    wave, flux, _ = spectrum([center], 500, [-0.5])
+    measured = lines.measure(wave, flux, [center])
+    assert np.isnan(measured['flux'][0]) and np.isnan(measured['ew'][0]) and np.isnan(measured['fwhm'][0])
+
+
+def test_line_outside_spectrum_is_nan():
+    wave, flux, _ = spectrum([], 500, [])
+    measured = lines.measure(wave, flux, [lines.MASTER['H-beta'][0]])
+    assert np.isnan(measured['flux'][0])